@@ -0,0 +1,78 @@
+"""compare payload size and serialization time of the default plotly json
+path (as used by st.plotly_chart) and the compact typed array path
+
+run from the project root: python -m charts.benchmark_serialization
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+from charts.create_figures import create_bar_chart, create_metrics
+from charts.serialization import to_compact_json
+
+TZ = "Europe/Berlin"
+SOURCES = [
+    "Biomass",
+    "Fossil Brown coal/Lignite",
+    "Fossil Gas",
+    "Fossil Hard coal",
+    "Hydro Run-of-river and poundage",
+    "Nuclear",
+    "Solar",
+    "Waste",
+    "Wind Offshore",
+    "Wind Onshore",
+]
+
+
+def bar_chart(days: int):
+    rng = np.random.default_rng(0)
+    end = pd.Timestamp.now(tz=TZ).floor("h")
+    index = pd.date_range(end - pd.Timedelta(days=days), end, freq="15min")
+    df = pd.DataFrame(
+        rng.uniform(0, 10_000, (len(index), len(SOURCES) + 2)),
+        index=index,
+        columns=SOURCES + ["FC_Solar_Wind", "FC_Other"],
+    )
+    df_load = pd.DataFrame(
+        {"Actual Consumption": rng.uniform(40_000, 70_000, len(index))}, index=index
+    )
+    return create_bar_chart(df, tz=TZ, df_load=df_load)
+
+
+def metrics_chart(years: int):
+    rng = np.random.default_rng(0)
+    today = pd.Timestamp.today(tz=TZ).floor("D")
+    index = pd.date_range(today - pd.DateOffset(years=years), today, freq="D")
+    df = pd.DataFrame({"data": rng.uniform(20, 80, len(index))}, index=index)
+    df = pd.pivot_table(
+        df.assign(year=df.index.year),
+        values="data",
+        index=df.index.day_of_year,
+        columns="year",
+    )
+    return create_metrics("", 50.0, tz=TZ, data_df=df, suffix="%")
+
+
+def measure(fig, number: int = 20) -> dict:
+    result = {}
+    for name, serialize in [
+        ("default", lambda: pio.to_json(fig, validate=False)),
+        ("compact", lambda: to_compact_json(fig)),
+    ]:
+        result[f"{name} bytes"] = len(serialize().encode())
+        seconds = min(timeit.repeat(serialize, number=number, repeat=3)) / number
+        result[f"{name} ms"] = round(seconds * 1000, 2)
+    return result
+
+
+if __name__ == "__main__":
+    figures = {
+        "bar chart 36h": bar_chart(days=1.5),
+        "bar chart 30d": bar_chart(days=30),
+        "metrics 10y": metrics_chart(years=10),
+    }
+    print(pd.DataFrame({name: measure(fig) for name, fig in figures.items()}).T)
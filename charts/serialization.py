@@ -0,0 +1,115 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the standard json module
+    orjson = None
+
+# trace attributes which carry the (potentially long) data arrays
+ARRAY_ATTRIBUTES = ("x", "y", "z", "values", "customdata")
+
+
+def use_fast_json_engine() -> None:
+    """let plotly (and thereby st.plotly_chart) serialize with orjson"""
+    if orjson is not None:
+        pio.json.config.default_engine = "orjson"
+
+
+def _typed_array(values: np.ndarray) -> dict:
+    if (
+        values.dtype.kind in "iub"
+        and len(values)
+        and (values.min() >= np.iinfo("i4").min and values.max() <= np.iinfo("i4").max)
+    ):
+        values = values.astype("<i4")
+        dtype = "i4"
+    else:
+        values = values.astype("<f8")
+        dtype = "f8"
+    return {"dtype": dtype, "bdata": base64.b64encode(values.tobytes()).decode()}
+
+
+def is_datetime(values) -> bool:
+    return isinstance(values, pd.DatetimeIndex) or pd.api.types.infer_dtype(
+        values, skipna=False
+    ) in ("datetime", "datetime64")
+
+
+def _wall_time_ms(values) -> np.ndarray:
+    if not isinstance(values, pd.DatetimeIndex):
+        # plotly keeps timestamps as object arrays, building the index from
+        # the integer values is much faster than parsing the objects
+        tz = getattr(values[0], "tz", None)
+        ns = np.fromiter((pd.Timestamp(t).value for t in values), "i8", len(values))
+        values = pd.DatetimeIndex(ns.view("M8[ns]"))
+        if tz is not None:
+            values = values.tz_localize("UTC").tz_convert(tz)
+    if values.tz is not None:
+        values = values.tz_localize(None)
+    return values.as_unit("ms").asi8.astype("f8")
+
+
+def encode_array(values) -> dict | None:
+    """plotly.js typed array (base64 binary) spec of a numeric or datetime
+    array, None if the values can not be encoded.
+
+    Timestamps are encoded as milliseconds since epoch of their wall time,
+    a date axis shows them like the iso strings of the default path.
+    """
+    if values is None or isinstance(values, (str, dict)) or len(values) == 0:
+        return None
+    if not isinstance(values, (pd.Index, np.ndarray)):
+        values = np.asarray(values)
+
+    if values.dtype.kind in "fiub":
+        return _typed_array(np.asarray(values))
+    if is_datetime(values):
+        return _typed_array(_wall_time_ms(values))
+    return None
+
+
+def compact_spec(fig: go.Figure) -> dict:
+    """figure dict with all numeric and datetime data arrays as typed
+    arrays; axes with encoded timestamps are forced to type date.
+    The figure itself is not altered.
+    """
+    # shallow copies of plotly's trace and layout dicts, the public
+    # to_plotly_json deep copies every data array
+    layout = dict(fig._layout)
+    data = []
+
+    for trace in fig._data:
+        trace = dict(trace)
+        for attribute in ARRAY_ATTRIBUTES:
+            values = trace.get(attribute)
+            if (encoded := encode_array(values)) is None:
+                continue
+            trace[attribute] = encoded
+            if attribute in ("x", "y") and is_datetime(values):
+                axis = trace.get(f"{attribute}axis", attribute)
+                axis = axis.replace(attribute, f"{attribute}axis", 1)
+                layout[axis] = {**layout.get(axis, {}), "type": "date"}
+        data.append(trace)
+
+    return {"data": data, "layout": layout}
+
+
+def compact_figure(fig: go.Figure) -> go.Figure:
+    """figure with typed arrays, e.g. to be passed to st.plotly_chart"""
+    return go.Figure(compact_spec(fig))
+
+
+def to_compact_json(fig: go.Figure) -> str:
+    """json of the figure with typed arrays, serialized with orjson if
+    available
+    """
+    return pio.to_json(
+        compact_spec(fig),
+        validate=False,
+        engine="orjson" if orjson is not None else "json",
+    )
@@ -0,0 +1,135 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from etl.cache import get_cache
+from etl.data import Data
+
+logger = logging.getLogger("app_logger")
+
+# the entsoe.Area members that are whole countries: bidding zones within a
+# country (DE_50HZ, IT_NORD, NO_1, ...) and areas of several countries
+# (DE_LU, DE_AT_LU, CWE, IE_SEM, UK, ...) would count generation twice
+COUNTRY_CODES = (
+    "AL", "AT", "BA", "BE", "BG", "CH", "CY", "CZ", "DE", "DK", "EE", "ES",
+    "FI", "FR", "GB", "GE", "GR", "HR", "HU", "IE", "IT", "LT", "LU", "LV",
+    "MD", "ME", "MK", "MT", "NIE", "NL", "NO", "PL", "PT", "RO", "RS", "SE",
+    "SI", "SK", "TR", "UA", "XK",
+)  # fmt: skip
+
+
+class EuropeanAggregate:
+    """generation of many bidding zones aligned in one dense
+    country x time x source array [MW], so that continental totals and
+    rankings are vectorized numpy reductions.
+
+    values[c, t, s] is the mean generation of country c in time step t
+    for source s, NaN if the country does not report the source or the
+    time step is missing; mask holds where values are valid.
+    """
+
+    def __init__(self, frames: dict[str, pd.DataFrame], freq: str = "1h"):
+        frames = {
+            code.upper(): self.to_source_frame(df, freq)
+            for code, df in frames.items()
+            if not df.empty
+        }
+        self.freq = freq
+        self.countries = pd.Index(sorted(frames), name="country")
+        self.sources = pd.Index(
+            sorted({source for df in frames.values() for source in df.columns}),
+            name="source",
+        )
+
+        if frames:
+            start = min(df.index[0] for df in frames.values())
+            end = max(df.index[-1] for df in frames.values())
+            self.times = pd.date_range(start, end, freq=freq, name="time")
+        else:
+            self.times = pd.DatetimeIndex([], tz="UTC", name="time")
+
+        self.values = np.full(
+            (len(self.countries), len(self.times), len(self.sources)), np.nan
+        )
+        for i, code in enumerate(self.countries):
+            df = frames[code]
+            rows = self.times.get_indexer(df.index)
+            cols = self.sources.get_indexer(df.columns)
+            self.values[i, rows[:, None], cols[None, :]] = df.to_numpy(dtype="f8")
+        self.mask = ~np.isnan(self.values)
+
+    @staticmethod
+    def to_source_frame(df: pd.DataFrame, freq: str) -> pd.DataFrame:
+        """bring a CURRENT_GENERATION_ENTSOE frame onto the common grid:
+        one column per source, UTC, mean per time step
+        """
+        if isinstance(df.columns, pd.MultiIndex):
+            df = df.stack(level=0).pipe(Data.custom_unstack)
+        return df.tz_convert("UTC").resample(freq).mean().dropna(how="all")
+
+    @classmethod
+    def from_instant_data(
+        cls, countries=None, cache=None, freq: str = "1h"
+    ) -> "EuropeanAggregate":
+        """build the aggregate from the cached generation of the countries
+        in COUNTRY_CODES (or the given bidding zones) that are available
+        """
+        cache = cache or get_cache()
+        key_name = Data.name_keys().CURRENT_GENERATION_ENTSOE.name
+        codes = [code.upper() for code in (countries or COUNTRY_CODES)]
+        frames = {}
+        for code in codes:
+            if (df := cache.read(key_name, code)) is not None:
+                frames[code] = df
+        logger.debug(f"european aggregate of {len(frames)} bidding zones")
+        return cls(frames, freq=freq)
+
+    def totals_by_source(self) -> pd.DataFrame:
+        """continental generation per time step and source [MW]"""
+        totals = np.where(self.mask.any(axis=0), np.nansum(self.values, axis=0), np.nan)
+        return pd.DataFrame(totals, index=self.times, columns=self.sources)
+
+    def total(self) -> pd.Series:
+        """continental generation per time step [MW]"""
+        return self.totals_by_source().sum(axis=1, min_count=1).rename("Total")
+
+    def power_mix(self) -> tuple[pd.Series, pd.Timestamp]:
+        """continental generation by source [MW] of the latest time step
+        reported by all countries
+        """
+        reported = self.mask.any(axis=2).all(axis=0)
+        if not reported.any():
+            raise ValueError("no time step reported by all countries")
+        i = int(np.flatnonzero(reported)[-1])
+        return self.totals_by_source().iloc[i].rename("power_mw"), self.times[i]
+
+    def share_by_source(self) -> pd.DataFrame:
+        """share of each source in the continental generation per time step"""
+        totals = self.totals_by_source()
+        return totals.div(totals.sum(axis=1, min_count=1), axis=0)
+
+    def by_country(self, source: str | None = None) -> pd.DataFrame:
+        """generation per time step and country [MW], total or of one source"""
+        if source is None:
+            values = np.where(
+                self.mask.any(axis=2), np.nansum(self.values, axis=2), np.nan
+            )
+        else:
+            values = self.values[:, :, self.sources.get_loc(source)]
+        return pd.DataFrame(values.T, index=self.times, columns=self.countries)
+
+    def coverage(self) -> pd.Series:
+        """share of time steps per country with at least one valid source"""
+        return pd.Series(
+            self.mask.any(axis=2).mean(axis=1), index=self.countries, name="coverage"
+        )
+
+    def ranking(self, source: str | None = None, start=None, end=None) -> pd.Series:
+        """countries ranked by their mean generation [MW] in [start, end),
+        in total or of one source
+        """
+        i0 = self.times.searchsorted(pd.Timestamp(start)) if start else 0
+        i1 = self.times.searchsorted(pd.Timestamp(end)) if end else len(self.times)
+        window = self.by_country(source).iloc[i0:i1]
+        return window.mean().dropna().sort_values(ascending=False).rename("mean")
@@ -0,0 +1,310 @@
+"""read-only http api of the dashboard metrics, computed from the cache the
+dashboard writes (CACHE_BACKEND, CACHE_DB as for the app):
+
+GET /v1/countries                        cached countries
+GET /v1/{country}/capacity-factors       yesterday's capacity factor by source
+GET /v1/{country}/power-mix              latest complete generation by source
+GET /v1/{country}/kpis                   yesterday's generation and renewable share
+GET /v1/europe/power-mix                 continental generation by source of the
+                                         latest hour reported by all countries
+
+as json or, with ?format=arrow or Accept: application/vnd.apache.arrow.stream,
+as an arrow ipc stream. python -m etl.api --port 8502
+"""
+
+import argparse
+import hashlib
+import http.server
+import io
+import json
+import logging
+import threading
+import time
+import urllib.parse
+
+import pandas as pd
+from entsoe import Area
+
+from etl.aggregation import COUNTRY_CODES, EuropeanAggregate
+from etl.cache import HISTORY_PREFIX, get_cache
+from etl.data import Data, Freshness
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # optional, only json responses without it
+    pa = None
+
+logger = logging.getLogger("app_logger")
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+# seconds between two checks of the cache for new versions of a country
+CHECK_EVERY = 5
+# max-age of the responses for http caches
+MAX_AGE = 60
+
+
+def capacity_factors(data: Data) -> tuple[pd.DataFrame, dict]:
+    annotation, df = data.daily_capacity_factor_by_source()
+    return df.rename_axis("source").reset_index(), {"note": annotation}
+
+
+def power_mix(data: Data) -> tuple[pd.DataFrame, dict]:
+    df, time_step = data.current_power_mix()
+    return (
+        df.rename(columns={"data": "power_mw"}).rename_axis("source").reset_index(),
+        {"time": pd.Timestamp(time_step).isoformat()},
+    )
+
+
+def kpis(data: Data) -> tuple[pd.DataFrame, dict]:
+    yesterday = pd.Timestamp.now(tz=data.country.tz).floor("D") - pd.Timedelta(days=1)
+    total_generation, max_generation = data.total_power_aggregated_yesterday()
+    df = pd.DataFrame(
+        {
+            "date": [yesterday.date().isoformat()],
+            "total_generation_twh": [float(total_generation)],
+            "max_generation_twh": [float(max_generation)],
+            "renewable_share_percent": [float(data.renewable_share_yesterday2())],
+        }
+    )
+    return df, {}
+
+
+def europe_power_mix(aggregate: EuropeanAggregate) -> tuple[pd.DataFrame, dict]:
+    df, time_step = aggregate.power_mix()
+    return (
+        df.rename_axis("source").reset_index(),
+        {"time": time_step.isoformat(), "countries": list(aggregate.countries)},
+    )
+
+
+METRICS = {
+    "capacity-factors": capacity_factors,
+    "power-mix": power_mix,
+    "kpis": kpis,
+}
+# metrics of the pseudo country EUROPE, computed from an EuropeanAggregate
+EUROPE = "EUROPE"
+EUROPE_METRICS = {
+    "power-mix": europe_power_mix,
+}
+
+
+class Response:
+    """serialized metric, computed once per cache version"""
+
+    def __init__(self, body: bytes, media_type: str, etag: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+
+
+def to_json(df: pd.DataFrame, meta: dict) -> bytes:
+    # to_json writes NaN as null
+    records = json.loads(df.to_json(orient="records", date_format="iso"))
+    return json.dumps({**meta, "data": records}).encode()
+
+
+def to_arrow(df: pd.DataFrame, meta: dict) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"meta": json.dumps(meta).encode()}
+    )
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+class MetricStore:
+    """responses of all metrics of a country, recomputed only when the cache
+    holds new datasets of the country (checked at most every CHECK_EVERY
+    seconds). Requests of a country being recomputed wait for it.
+    """
+
+    def __init__(self, cache=None, check_every: float = CHECK_EVERY):
+        self.cache = cache or get_cache()
+        self.check_every = check_every
+        self.lock = threading.Lock()
+        # country: lock, signature, time of the last check and responses
+        self.countries: dict[str, dict] = {}
+
+    def countries_cached(self) -> list[str]:
+        return sorted(
+            {
+                country_code
+                for key_name, country_code in self.cache.entries()
+                if not key_name.startswith(HISTORY_PREFIX)
+            }
+        )
+
+    def signature(self, country_code: str) -> tuple:
+        """fetch times of the cached datasets of the country, of EUROPE the
+        fetch times of the generation of all countries
+        """
+        if country_code == EUROPE:
+            key_name = Data.name_keys().CURRENT_GENERATION_ENTSOE.name
+            return tuple(
+                (code, self.cache.fetched_at(key_name, code)) for code in COUNTRY_CODES
+            )
+        return tuple(
+            (key.name, self.cache.fetched_at(key.name, country_code))
+            for key in Data.name_keys()
+        )
+
+    def entry(self, country_code: str) -> dict:
+        with self.lock:
+            return self.countries.setdefault(
+                country_code,
+                {
+                    "lock": threading.Lock(),
+                    "signature": None,
+                    "checked": float("-inf"),
+                    "responses": {},
+                },
+            )
+
+    def get(self, country_code: str, metric: str, media_type: str) -> Response | None:
+        """the response of the metric, None if the country is not cached"""
+        if country_code != EUROPE and country_code not in Area.__members__:
+            return None  # no entry for any code of a url
+        entry = self.entry(country_code)
+        with entry["lock"]:
+            if time.monotonic() - entry["checked"] >= self.check_every:
+                signature = self.signature(country_code)
+                if signature != entry["signature"]:
+                    entry["responses"] = self.build(country_code, signature)
+                    entry["signature"] = signature
+                entry["checked"] = time.monotonic()
+            return entry["responses"].get((metric, media_type))
+
+    def build(self, country_code: str, signature: tuple) -> dict:
+        if all(fetched_at is None for _, fetched_at in signature):
+            return {}
+        if country_code == EUROPE:
+            data = EuropeanAggregate.from_instant_data(cache=self.cache)
+            metrics = EUROPE_METRICS
+            data_end = data.times[-1] if len(data.times) else None
+        else:
+            data = Data(country_code)
+            for key_name, df in self.cache.read_country(country_code).items():
+                data.add(
+                    key_name,
+                    df,
+                    country_code,
+                    self.cache.freshness(key_name, country_code),
+                )
+            metrics = METRICS
+            data_end = Freshness.of(data.get("CURRENT_GENERATION_ENTSOE")).data_end
+        fetched_at = max(t for _, t in signature if t is not None)
+        version = hashlib.sha1(repr(signature).encode()).hexdigest()[:16]
+
+        responses = {}
+        for metric, compute in metrics.items():
+            try:
+                df, meta = compute(data)
+            except Exception as e:  # incomplete datasets
+                logger.warning(f"api: {metric} of {country_code} failed: {e!r}")
+                continue
+            meta = {
+                "country": country_code,
+                "metric": metric,
+                "fetched_at": pd.Timestamp(fetched_at, unit="s", tz="UTC").isoformat(),
+                "data_end": data_end.isoformat() if data_end else None,
+                **meta,
+            }
+            serializers = {"json": ("application/json", to_json)}
+            if pa is not None:
+                serializers["arrow"] = (ARROW_MEDIA_TYPE, to_arrow)
+            for name, (media_type, serialize) in serializers.items():
+                responses[(metric, media_type)] = Response(
+                    serialize(df, meta), media_type, f'"{version}-{metric}-{name}"'
+                )
+        logger.debug(f"api: metrics of {country_code} computed ({version})")
+        return responses
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    store: MetricStore  # set by serve
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["v1", "countries"]:
+            return self.send_body(
+                200,
+                json.dumps({"countries": self.store.countries_cached()}).encode(),
+                "application/json",
+            )
+        if len(parts) != 3 or parts[0] != "v1":
+            return self.send_error_json(404, f"unknown path {url.path}")
+        country_code, metric = parts[1].upper(), parts[2]
+        if metric not in (EUROPE_METRICS if country_code == EUROPE else METRICS):
+            return self.send_error_json(404, f"unknown path {url.path}")
+
+        arrow = query.get("format", [""])[
+            0
+        ] == "arrow" or ARROW_MEDIA_TYPE in self.headers.get("Accept", "")
+        if arrow and pa is None:
+            return self.send_error_json(406, "arrow responses require pyarrow")
+        media_type = ARROW_MEDIA_TYPE if arrow else "application/json"
+
+        response = self.store.get(country_code, metric, media_type)
+        if response is None:
+            return self.send_error_json(404, f"no {metric} data of {country_code}")
+
+        if response.etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", response.etag)
+            self.send_header("Cache-Control", f"max-age={MAX_AGE}")
+            self.send_header("Vary", "Accept")
+            self.end_headers()
+            return
+        self.send_body(200, response.body, response.media_type, response.etag)
+
+    def send_body(
+        self, status: int, body: bytes, media_type: str, etag: str | None = None
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", media_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"max-age={MAX_AGE}")
+            # json or arrow of the same url, depending on the Accept header
+            self.send_header("Vary", "Accept")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, message: str) -> None:
+        self.send_body(
+            status, json.dumps({"error": message}).encode(), "application/json"
+        )
+
+    def log_message(self, format, *args) -> None:
+        logger.debug(f"api: {self.address_string()} {format % args}")
+
+
+def serve(host: str = "127.0.0.1", port: int = 8502, store: MetricStore | None = None):
+    """threading http server of the metrics, one thread per connection"""
+    handler = type("Handler", (MetricsHandler,), {"store": store or MetricStore()})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="read-only api of the metrics")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port)
+    print(f"serving metrics on http://{args.host}:{args.port}/v1/countries")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,189 @@
+import argparse
+import collections
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+
+import httpx
+import pandas as pd
+import trio
+
+from etl.coalesce import IGNORED_PARAMS
+from etl.files import atomic_write
+from etl.memory import shared
+
+logger = logging.getLogger("app_logger")
+
+cfd = pathlib.Path(__file__).parent
+
+
+class ResponseArchive:
+    """content-addressed archive of raw api responses (ENTSO-E xml,
+    Energy-Charts json), to rebuild the cache without calling the apis.
+
+    objects/<sha256 of the body>.gz   gzip compressed response body
+    refs/<sha256 of the request>.json request (url, params without token),
+                                      data key, country and content hash
+    """
+
+    def __init__(self, path=cfd / "archive"):
+        self.path = pathlib.Path(path)
+        (self.path / "objects").mkdir(parents=True, exist_ok=True)
+        (self.path / "refs").mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ResponseArchive | None":
+        """the archive of the process in RESPONSE_ARCHIVE_PATH, None if
+        archiving is disabled
+        """
+        path = os.getenv("RESPONSE_ARCHIVE_PATH", "")
+        if not path:
+            return None
+        with _archives_lock:
+            if path not in _archives:
+                _archives[path] = shared(cls(path))
+            return _archives[path]
+
+    @staticmethod
+    def request_params_without_token(request_params) -> dict:
+        return {
+            name: str(value)
+            for name, value in sorted(request_params.params.items())
+            if name not in IGNORED_PARAMS
+        }
+
+    @classmethod
+    def request_digest(cls, request_params) -> str:
+        request = json.dumps(
+            [request_params.url, cls.request_params_without_token(request_params)]
+        )
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def store(
+        self,
+        request_params,
+        country_code: str,
+        response: httpx.Response,
+        history: bool = False,
+    ):
+        """archive the response body once and point the request ref to it,
+        `history`: the response was backfilled into the history of the key
+        """
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        object_path = self.path / "objects" / f"{content_hash}.gz"
+        if not object_path.exists():
+            atomic_write(object_path, gzip.compress(response.content))
+
+        ref = {
+            "key": request_params.key.name,
+            "country": country_code.upper(),
+            "url": request_params.url,
+            "params": self.request_params_without_token(request_params),
+            "content_hash": content_hash,
+            "status_code": response.status_code,
+            "content_type": response.headers.get("content-type", ""),
+            "fetched_at": pd.Timestamp.now(tz="UTC").isoformat(),
+            "history": history,
+        }
+        ref_path = self.path / "refs" / f"{self.request_digest(request_params)}.json"
+        atomic_write(ref_path, json.dumps(ref))
+        return content_hash
+
+    def entries(self) -> list[dict]:
+        return [
+            json.loads(ref_path.read_text())
+            for ref_path in sorted((self.path / "refs").glob("*.json"))
+        ]
+
+    def load(self, entry: dict) -> httpx.Response:
+        """rebuild the archived response of a ref entry"""
+        object_path = self.path / "objects" / f"{entry['content_hash']}.gz"
+        return httpx.Response(
+            status_code=entry["status_code"],
+            content=gzip.decompress(object_path.read_bytes()),
+            headers={"content-type": entry["content_type"]},
+            request=httpx.Request("GET", entry["url"], params=entry["params"]),
+        )
+
+
+_archives: dict[str, ResponseArchive] = {}
+_archives_lock = threading.Lock()
+
+
+async def retransform(archive: ResponseArchive, workers: int = 4) -> None:
+    """rebuild every cached dataset from the archived responses, parsing
+    runs in parallel worker threads, no network calls are made.
+
+    A live dataset is rebuilt from the most recently fetched response of its
+    key and country only, backfilled responses are merged into the history
+    of the key in the order they were fetched.
+    """
+    from etl.data import Data
+    from etl.etl import DataPipeline, DataProcessor, RequestParams
+
+    entries = archive.entries()
+    limiter = trio.CapacityLimiter(workers)
+    processors = {}
+    # (key, country, history): entries, oldest first
+    groups = collections.defaultdict(list)
+    for entry in sorted(entries, key=lambda entry: entry["fetched_at"]):
+        groups[(entry["key"], entry["country"], entry.get("history", False))].append(
+            entry
+        )
+
+    async def transform_entry(pipeline, entry, results, i):
+        response = await trio.to_thread.run_sync(archive.load, entry, limiter=limiter)
+        results[i] = await trio.to_thread.run_sync(
+            pipeline.transform, response, limiter=limiter
+        )
+
+    async def retransform_group(processor, key_name, history, group):
+        if not history:
+            # older responses of the key were replaced by the newest one
+            group = group[-1:]
+        request = RequestParams(Data.name_keys()[key_name], group[0]["url"], {})
+        pipeline = DataPipeline(processor, request, merge=history)
+        frames = [None] * len(group)
+        async with trio.open_nursery() as nursery:
+            for i, entry in enumerate(group):
+                nursery.start_soon(transform_entry, pipeline, entry, frames, i)
+        for df in frames:
+            await pipeline.load(df)
+        logger.debug(
+            f"retransformed {key_name} ({processor.data.country.code})"
+            f"{' history' if history else ''} from {len(group)} responses"
+        )
+
+    async with trio.open_nursery() as nursery:
+        for (key_name, country_code, history), group in groups.items():
+            if country_code not in processors:
+                processors[country_code] = DataProcessor(country_code)
+                # old responses would be scored as new actuals and forecasts
+                processors[country_code].forecast_accuracy = None
+            nursery.start_soon(
+                retransform_group,
+                processors[country_code],
+                key_name,
+                history,
+                group,
+            )
+
+    logger.info(f"retransformed {len(groups)} datasets from {len(entries)} responses")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="rebuild the cached datasets from the raw response archive"
+    )
+    parser.add_argument("command", choices=["retransform"])
+    parser.add_argument("--archive", default=os.getenv("RESPONSE_ARCHIVE_PATH"))
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    archive = ResponseArchive(args.archive) if args.archive else ResponseArchive()
+    trio.run(retransform, archive, args.workers)
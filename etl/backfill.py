@@ -0,0 +1,133 @@
+import argparse
+import json
+import logging
+import pathlib
+
+import httpx
+import pandas as pd
+import trio
+from dotenv import load_dotenv
+
+from etl.data import Data
+from etl.files import atomic_write
+from etl.etl import DataPipeline, DataProcessor, ENTSOE_MAX_PERIOD, split_period
+
+logger = logging.getLogger("app_logger")
+
+cfd = pathlib.Path(__file__).parent
+
+
+class Checkpoint:
+    """completed backfill windows, persisted after every window so that
+    an interrupted run resumes where it stopped
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.completed: set[str] = (
+            set(json.loads(self.path.read_text())) if self.path.exists() else set()
+        )
+
+    @staticmethod
+    def window_id(country_code, key_name, start, end) -> str:
+        return f"{country_code}|{key_name}|{start.isoformat()}|{end.isoformat()}"
+
+    def __contains__(self, window_id) -> bool:
+        return window_id in self.completed
+
+    def add(self, window_id) -> None:
+        self.completed.add(window_id)
+        atomic_write(self.path, json.dumps(sorted(self.completed)))
+
+
+async def backfill(
+    countries: list[str],
+    keys: list[str],
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    window: pd.Timedelta = pd.Timedelta(days=30),
+    concurrency: int = 4,
+    checkpoint_path=cfd / "tmp" / "backfill_history_checkpoint.json",
+) -> None:
+    """fetch the data keys of the countries for [start, end) in api
+    compliant windows, run concurrently (requests are limited by the shared
+    api rate limiter) and merged into the history of the keys in the cache
+    (etl.cache.history_key), apart from the live datasets of the dashboard
+    """
+    window = min(window, ENTSOE_MAX_PERIOD)
+    checkpoint = Checkpoint(checkpoint_path)
+    limiter = trio.CapacityLimiter(concurrency)
+
+    async def run_window(pipeline, client, window_id):
+        async with limiter:
+            df = await pipeline.run(client)
+        # failed requests (non 2xx responses included) leave a warning,
+        # windows are only done once their data was merged
+        if pipeline.warnings or df.empty:
+            logger.info(f"{window_id} not completed: {pipeline.warnings}")
+            return
+        checkpoint.add(window_id)
+        logger.debug(f"{window_id} completed")
+
+    async with httpx.AsyncClient(
+        timeout=60, transport=DataProcessor.transport
+    ) as client:
+        async with trio.open_nursery() as nursery:
+            for country_code in countries:
+                processor = DataProcessor(country_code)
+                tz = processor.data.country.tz
+                for key_name in keys:
+                    windows = (
+                        split_period(start.tz_convert(tz), end.tz_convert(tz), window)
+                        if key_name.endswith("ENTSOE")
+                        else [(start, end)]
+                    )
+                    for window_start, window_end in windows:
+                        window_id = Checkpoint.window_id(
+                            processor.data.country.code,
+                            key_name,
+                            window_start,
+                            window_end,
+                        )
+                        if window_id in checkpoint:
+                            continue
+                        request = processor.request_params(
+                            key_name, window_start, window_end
+                        )
+                        pipeline = DataPipeline(processor, request, merge=True)
+                        nursery.start_soon(
+                            run_window, pipeline, client, window_id, name=window_id
+                        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="backfill historical data")
+    parser.add_argument("--countries", nargs="+", default=["DE"])
+    parser.add_argument(
+        "--keys",
+        nargs="+",
+        default=[
+            "CURRENT_GENERATION_ENTSOE",
+            "ACTUAL_TOTAL_LOAD_ENTSOE",
+            "CAPACITY_BY_SOURCE_ENTSOE",
+        ],
+        choices=[key.name for key in Data.name_keys()],
+    )
+    parser.add_argument("--start", required=True, help="e.g. 2022-01-01")
+    parser.add_argument("--end", default=None, help="default: now")
+    parser.add_argument("--window-days", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    load_dotenv(cfd.parent / ".env")
+    logging.basicConfig(level=logging.INFO)
+
+    trio.run(
+        backfill,
+        args.countries,
+        args.keys,
+        pd.Timestamp(args.start, tz="UTC"),
+        pd.Timestamp(args.end, tz="UTC") if args.end else pd.Timestamp.now(tz="UTC"),
+        pd.Timedelta(days=args.window_days),
+        args.concurrency,
+    )
@@ -0,0 +1,377 @@
+import collections
+import contextlib
+import itertools
+import json
+import logging
+import os
+import pathlib
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+import pandas as pd
+
+from etl.data import Data, Freshness
+from etl.files import atomic_write
+from etl.memory import shared
+
+logger = logging.getLogger("app_logger")
+
+cfd = pathlib.Path(__file__).parent
+
+# flush every cache write to disk before it is committed (slower writes,
+# no lost datasets on power loss)
+CACHE_FSYNC = os.getenv("CACHE_FSYNC", "0") == "1"
+# seconds a cache write waits for writes of other keys to commit them
+# together (one transaction, one fsync), 0: no batching
+CACHE_BATCH_DELAY = float(os.getenv("CACHE_BATCH_DELAY", "0"))
+
+
+# prefix of the cache entries holding the backfilled history of a data key
+# (see etl.backfill): never replaced by the live etl, not read by sessions
+HISTORY_PREFIX = "HISTORY_"
+
+
+def history_key(key_name: str) -> str:
+    return HISTORY_PREFIX + key_name
+
+
+class PickleCache:
+    """one pickle file per dataset: tmp/{key}_{country}.pkl. Files are
+    written to a temporary file and renamed, readers see either the old or
+    the new dataset.
+    """
+
+    def __init__(self, path=cfd / "tmp", fsync: bool = CACHE_FSYNC):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+
+    def file_path(self, key_name: str, country_code: str) -> pathlib.Path:
+        return self.path / f"{key_name}_{country_code.upper()}.pkl"
+
+    def meta_path(self, key_name: str, country_code: str) -> pathlib.Path:
+        return self.file_path(key_name, country_code).with_suffix(".json")
+
+    def replace(self, file_path: pathlib.Path, content: bytes) -> None:
+        """atomically replace file_path with content"""
+        atomic_write(file_path, content, self.fsync)
+
+    def write(self, key_name: str, country_code: str, df: pd.DataFrame) -> None:
+        self.write_many([(key_name, country_code, df)])
+
+    def write_many(self, datasets: list[tuple[str, str, pd.DataFrame]]) -> None:
+        for key_name, country_code, df in datasets:
+            self.replace(
+                self.file_path(key_name, country_code),
+                pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+            # written after the dataset: a reader may see an older data end,
+            # never a data end the dataset does not have yet
+            data_end = Freshness.of(df).data_end
+            self.replace(
+                self.meta_path(key_name, country_code),
+                json.dumps(
+                    {"data_end": data_end.isoformat() if data_end else None}
+                ).encode(),
+            )
+        if self.fsync:
+            # the renames of the whole batch
+            fd = os.open(self.path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def read(self, key_name: str, country_code: str) -> pd.DataFrame | None:
+        file_path = self.file_path(key_name, country_code)
+        if not file_path.exists():
+            return None
+        data = pd.read_pickle(file_path)
+        return data if isinstance(data, pd.DataFrame) else data.to_frame()
+
+    def read_country(self, country_code: str) -> dict[str, pd.DataFrame]:
+        datasets = {}
+        for key in Data.name_keys():
+            if (df := self.read(key.name, country_code)) is not None:
+                datasets[key.name] = df
+        return datasets
+
+    def entries(self) -> list[tuple[str, str]]:
+        """(key name, country code) of all cached datasets"""
+        keys = [key.name for key in Data.name_keys()]
+        keys += [history_key(key_name) for key_name in keys]
+        return [
+            (key_name, file_path.stem[len(key_name) + 1 :])
+            for file_path in sorted(self.path.glob("*.pkl"))
+            for key_name in keys
+            if file_path.stem.startswith(key_name + "_")
+        ]
+
+    def fetched_at(self, key_name: str, country_code: str) -> float | None:
+        """unix time of the last write, None if not cached"""
+        file_path = self.file_path(key_name, country_code)
+        return file_path.stat().st_mtime if file_path.exists() else None
+
+    def freshness(self, key_name: str, country_code: str) -> Freshness | None:
+        """fetch time and data end of the dataset, None if not cached"""
+        if (fetched_at := self.fetched_at(key_name, country_code)) is None:
+            return None
+        meta_path = self.meta_path(key_name, country_code)
+        data_end = (
+            json.loads(meta_path.read_text())["data_end"]
+            if meta_path.exists()
+            else None
+        )
+        return Freshness(fetched_at, pd.Timestamp(data_end) if data_end else None)
+
+
+class SQLiteCache:
+    """datasets as zlib compressed pickle blobs in a sqlite database in WAL
+    mode: many processes read concurrently while one writer refreshes.
+    Every write increases the version of the dataset and stores its fetch
+    time.
+    """
+
+    def __init__(self, path=cfd / "tmp" / "cache.db", fsync: bool = CACHE_FSYNC):
+        self.path = pathlib.Path(path)
+        self.fsync = fsync
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite connections must not be shared between threads
+        self._local = threading.local()
+        with contextlib.closing(self.connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS datasets ("
+                "key TEXT, country TEXT, version INTEGER, fetched_at REAL, "
+                "payload BLOB, PRIMARY KEY (key, country))"
+            )
+            # databases created before the data end was stored
+            with contextlib.suppress(sqlite3.OperationalError):
+                connection.execute("ALTER TABLE datasets ADD COLUMN data_end TEXT")
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+        return connection
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if not hasattr(self._local, "connection"):
+            self._local.connection = self.connect()
+        return self._local.connection
+
+    @staticmethod
+    def dumps(df: pd.DataFrame) -> bytes:
+        return zlib.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def loads(payload: bytes) -> pd.DataFrame:
+        return pickle.loads(zlib.decompress(payload))
+
+    def write(self, key_name: str, country_code: str, df: pd.DataFrame) -> None:
+        self.write_many([(key_name, country_code, df)])
+
+    def write_many(self, datasets: list[tuple[str, str, pd.DataFrame]]) -> None:
+        """all datasets in one transaction"""
+        rows = []
+        for key_name, country_code, df in datasets:
+            data_end = Freshness.of(df).data_end
+            rows.append(
+                (
+                    key_name,
+                    country_code.upper(),
+                    time.time(),
+                    self.dumps(df),
+                    data_end.isoformat() if data_end else None,
+                )
+            )
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "INSERT INTO datasets "
+                "(key, country, version, fetched_at, payload, data_end) "
+                "VALUES (?, ?, 1, ?, ?, ?) "
+                "ON CONFLICT (key, country) DO UPDATE SET "
+                "version = version + 1, fetched_at = excluded.fetched_at, "
+                "payload = excluded.payload, data_end = excluded.data_end",
+                rows,
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def read(self, key_name: str, country_code: str) -> pd.DataFrame | None:
+        row = self.connection.execute(
+            "SELECT payload FROM datasets WHERE key = ? AND country = ?",
+            (key_name, country_code.upper()),
+        ).fetchone()
+        return self.loads(row[0]) if row else None
+
+    def read_country(self, country_code: str) -> dict[str, pd.DataFrame]:
+        # only the datasets of the dashboard, not the history blobs
+        keys = [key.name for key in Data.name_keys()]
+        return {
+            key_name: self.loads(payload)
+            for key_name, payload in self.connection.execute(
+                "SELECT key, payload FROM datasets WHERE country = ? "
+                f"AND key IN ({', '.join('?' * len(keys))})",
+                (country_code.upper(), *keys),
+            )
+        }
+
+    def entries(self) -> list[tuple[str, str]]:
+        """(key name, country code) of all cached datasets"""
+        return self.connection.execute(
+            "SELECT key, country FROM datasets ORDER BY key, country"
+        ).fetchall()
+
+    def fetched_at(self, key_name: str, country_code: str) -> float | None:
+        row = self.connection.execute(
+            "SELECT fetched_at FROM datasets WHERE key = ? AND country = ?",
+            (key_name, country_code.upper()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def freshness(self, key_name: str, country_code: str) -> Freshness | None:
+        """fetch time and data end of the dataset, None if not cached"""
+        row = self.connection.execute(
+            "SELECT fetched_at, data_end FROM datasets WHERE key = ? AND country = ?",
+            (key_name, country_code.upper()),
+        ).fetchone()
+        if row is None:
+            return None
+        return Freshness(row[0], pd.Timestamp(row[1]) if row[1] else None)
+
+    def version(self, key_name: str, country_code: str) -> int:
+        row = self.connection.execute(
+            "SELECT version FROM datasets WHERE key = ? AND country = ?",
+            (key_name, country_code.upper()),
+        ).fetchone()
+        return row[0] if row else 0
+
+
+class CacheWriter:
+    """blocking cache writes for worker threads. With a delay, the first
+    write of a batch waits `delay` seconds for writes of other threads and
+    commits them all with one write_many, the others wait for its commit.
+
+    Writes of a dataset are serialized. A write with a ticket (see `ticket`)
+    is dropped if a write with a later ticket of the dataset was already
+    done, so a slow worker thread can not replace a newer dataset with an
+    older one.
+    """
+
+    def __init__(self, cache: "PickleCache | SQLiteCache", delay: float = 0.0):
+        self.cache = cache
+        self.delay = delay
+        self.lock = threading.Lock()
+        # datasets of the open batch, its commit event and error
+        self.batch: dict | None = None
+        self.tickets = itertools.count(1)
+        # (key, country): lock serializing the writes, latest written ticket
+        self.dataset_locks: dict[tuple, threading.Lock] = collections.defaultdict(
+            threading.Lock
+        )
+        self.written: dict[tuple, int] = {}
+
+    def ticket(self) -> int:
+        """increasing number, taken when a dataset is committed (in memory)
+        and passed to its write
+        """
+        with self.lock:
+            return next(self.tickets)
+
+    def write(
+        self,
+        key_name: str,
+        country_code: str,
+        df: pd.DataFrame,
+        ticket: int | None = None,
+    ) -> bool:
+        """write the dataset, False if it was dropped as outdated"""
+        dataset = (key_name, country_code.upper())
+        with self.lock:
+            dataset_lock = self.dataset_locks[dataset]
+        with dataset_lock:
+            if ticket is not None and ticket < self.written.get(dataset, 0):
+                logger.debug(f"cache: outdated write of {key_name} dropped")
+                return False
+            self.commit(key_name, country_code, df)
+            if ticket is not None:
+                self.written[dataset] = ticket
+        return True
+
+    def commit(self, key_name: str, country_code: str, df: pd.DataFrame) -> None:
+        if self.delay <= 0:
+            self.cache.write(key_name, country_code, df)
+            return
+
+        with self.lock:
+            batch = self.batch
+            leader = batch is None
+            if leader:
+                batch = self.batch = {
+                    "datasets": {},
+                    "done": threading.Event(),
+                    "error": None,
+                }
+            # one write per dataset, writes of a dataset are serialized
+            batch["datasets"][(key_name, country_code.upper())] = df
+
+        if leader:
+            time.sleep(self.delay)
+            with self.lock:
+                self.batch = None
+            try:
+                self.cache.write_many(
+                    [
+                        (key, country, df)
+                        for (key, country), df in batch["datasets"].items()
+                    ]
+                )
+            except Exception as e:
+                batch["error"] = e
+            finally:
+                batch["done"].set()
+        else:
+            batch["done"].wait()
+
+        if batch["error"] is not None:
+            raise batch["error"]
+
+
+_caches: dict[str, PickleCache | SQLiteCache] = {}
+_writers: dict[str, CacheWriter] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache() -> PickleCache | SQLiteCache:
+    """the cache backend of the process, chosen with CACHE_BACKEND
+    ("pickle" (default) or "sqlite", stored in CACHE_DB)
+    """
+    backend = os.getenv("CACHE_BACKEND", "pickle").lower()
+    with _caches_lock:
+        if backend not in _caches:
+            if backend == "sqlite":
+                _caches[backend] = shared(
+                    SQLiteCache(os.getenv("CACHE_DB", cfd / "tmp" / "cache.db"))
+                )
+            else:
+                _caches[backend] = shared(PickleCache())
+            logger.debug(f"cache backend: {backend}")
+        return _caches[backend]
+
+
+def get_cache_writer() -> CacheWriter:
+    """the writer of the process cache, batching with CACHE_BATCH_DELAY"""
+    cache = get_cache()
+    backend = os.getenv("CACHE_BACKEND", "pickle").lower()
+    with _caches_lock:
+        if backend not in _writers:
+            _writers[backend] = shared(CacheWriter(cache, CACHE_BATCH_DELAY))
+        return _writers[backend]
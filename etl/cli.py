@@ -0,0 +1,187 @@
+"""headless etl runs for cron jobs and containers: fetch the data keys of
+the countries into the cache and report per pipeline status, duration and
+size. Exits with 1 if any pipeline did not complete.
+
+python -m etl.cli --countries DE FR --keys CURRENT_GENERATION_ENTSOE --format json
+"""
+
+import argparse
+import functools
+import json
+import logging
+import pathlib
+import sys
+
+import trio
+from dotenv import load_dotenv
+
+from etl.data import Data
+from etl.etl import PIPELINE_TIMEOUT, RETRIES, DataProcessor
+
+logger = logging.getLogger("app_logger")
+
+cfd = pathlib.Path(__file__).parent
+
+# states of pipelines which did not deliver their dataset
+FAILED_STATES = ("failed", "timed out", "cancelled")
+
+
+def plan(countries: list[str], keys: list[str] | None, force: bool) -> list[dict]:
+    """the requests a run would send, datasets fresh in the cache are
+    skipped unless forced
+    """
+    rows = []
+    for country_code in countries:
+        processor = DataProcessor(country_code)
+        for request in processor.planned_requests(keys):
+            fresh = not force and processor.read_if_fresh(request.key.name)
+            params = {
+                name: "***" if name == "securityToken" else value
+                for name, value in request.params.items()
+            }
+            rows.append(
+                {
+                    "country": processor.data.country.code,
+                    "key": request.key.name,
+                    "action": "skip (fresh)" if fresh else "fetch",
+                    "url": request.url,
+                    "params": params,
+                }
+            )
+    return rows
+
+
+def report(processor: DataProcessor) -> list[dict]:
+    """status, duration [s], rows and bytes per data key of the last run"""
+    rows = []
+    for key_name, status in processor.status.items():
+        df = processor.data.get(key_name)
+        duration = processor.durations.get(key_name)
+        rows.append(
+            {
+                "country": processor.data.country.code,
+                "key": key_name,
+                "status": status,
+                "seconds": None if duration is None else round(duration, 2),
+                "rows": 0 if df is None else len(df),
+                "bytes": 0 if df is None else int(df.memory_usage(deep=True).sum()),
+            }
+        )
+    return rows
+
+
+async def run(
+    countries: list[str],
+    keys: list[str] | None = None,
+    concurrency: int = 6,
+    retries: int = RETRIES,
+    timeout: float = 300,
+    pipeline_timeout: float = PIPELINE_TIMEOUT,
+    force: bool = False,
+) -> list[dict]:
+    """run the etl of all countries concurrently, at most `concurrency`
+    pipelines at once; pipelines still running at `timeout` are cancelled
+    """
+    limiter = trio.CapacityLimiter(concurrency)
+    processors = [DataProcessor(country_code) for country_code in countries]
+    async with trio.open_nursery() as nursery:
+        for processor in processors:
+            nursery.start_soon(
+                functools.partial(
+                    processor.run_etl,
+                    timeout=timeout,
+                    pipeline_timeout=pipeline_timeout,
+                    partial=False,
+                    keys=keys,
+                    retries=retries,
+                    force=force,
+                    limiter=limiter,
+                ),
+                name=processor.data.country.code,
+            )
+    return [row for processor in processors for row in report(processor)]
+
+
+def print_table(rows: list[dict]) -> None:
+    if not rows:
+        print("nothing to do")
+        return
+    columns = list(rows[0].keys())
+    cells = [[str(row[column]) for column in columns] for row in rows]
+    widths = [
+        max(len(column), *(len(row[i]) for row in cells))
+        for i, column in enumerate(columns)
+    ]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="fetch the data of the dashboard into the cache"
+    )
+    parser.add_argument("--countries", nargs="+", default=["DE"])
+    parser.add_argument(
+        "--keys",
+        nargs="+",
+        default=None,
+        choices=[key.name for key in Data.name_keys()],
+        help="default: all",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=6, help="pipelines running at once"
+    )
+    parser.add_argument(
+        "--retries", type=int, default=RETRIES, help="attempts per request"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=300, help="deadline of the run [s]"
+    )
+    parser.add_argument(
+        "--pipeline-timeout",
+        type=float,
+        default=PIPELINE_TIMEOUT,
+        help="deadline of a pipeline [s]",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="fetch datasets fresh in the cache"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the planned requests"
+    )
+    parser.add_argument("--format", choices=["table", "json"], default="table")
+    parser.add_argument("--verbose", action="store_true", help="show the etl logs")
+    args = parser.parse_args(argv)
+
+    load_dotenv(cfd.parent / ".env")
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+    countries = [country_code.upper() for country_code in args.countries]
+
+    if args.dry_run:
+        rows = plan(countries, args.keys, args.force)
+    else:
+        rows = trio.run(
+            run,
+            countries,
+            args.keys,
+            args.concurrency,
+            args.retries,
+            args.timeout,
+            args.pipeline_timeout,
+            args.force,
+        )
+
+    if args.format == "json":
+        print(json.dumps(rows, indent=2))
+    else:
+        print_table(rows)
+
+    if any(row.get("status") in FAILED_STATES for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
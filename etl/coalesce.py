@@ -0,0 +1,128 @@
+import collections
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+import trio
+
+from etl.memory import shared
+
+logger = logging.getLogger("app_logger")
+
+# request parameters which do not change the response
+IGNORED_PARAMS = ("securityToken",)
+
+
+class _Flight:
+    """a request in flight, shared by the leader and all waiting callers"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Exception | None = None
+        self.succeeded = False
+
+
+class RequestCoalescer:
+    """single-flight coalescing of identical requests.
+
+    Every streamlit session runs its own trio loop in its own thread,
+    therefore the bookkeeping is guarded by a threading lock and callers
+    wait for the leader's threading.Event in a worker thread.
+    Successful results are kept for `ttl` seconds to absorb bursts of
+    requests, expired ones are dropped whenever a result is stored.
+    """
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._in_flight: dict[tuple, _Flight] = {}
+        self._results: dict[tuple, tuple[float, Any]] = {}
+        self.stats: collections.Counter = collections.Counter()
+
+    @staticmethod
+    def request_key(request_params) -> tuple:
+        params = tuple(
+            sorted(
+                (name, str(value))
+                for name, value in request_params.params.items()
+                if name not in IGNORED_PARAMS
+            )
+        )
+        return (request_params.url, params)
+
+    def _cached(self, key):
+        expires, result = self._results.get(key, (0.0, None))
+        if expires > time.monotonic():
+            return result
+        self._results.pop(key, None)
+        return None
+
+    def _store(self, key, result) -> None:
+        now = time.monotonic()
+        expired = [k for k, (expires, _) in self._results.items() if expires <= now]
+        for k in expired:
+            del self._results[k]
+        self._results[key] = (now + self.ttl, result)
+
+    async def run(
+        self,
+        request_params,
+        fetch: Callable[[], Awaitable[Any]],
+        keep: Callable[[Any], bool] = lambda result: True,
+    ) -> Any:
+        """return the result of `fetch`, shared with all concurrent callers
+        asking for the same request; kept for later callers only if
+        `keep(result)`, e.g. not a failed fetch
+        """
+        key = self.request_key(request_params)
+        with self._lock:
+            self.stats["requests"] += 1
+
+        while True:
+            with self._lock:
+                if (result := self._cached(key)) is not None:
+                    self.stats["cache_hits"] += 1
+                    return result
+                flight = self._in_flight.get(key)
+                if flight is None:
+                    flight = self._in_flight[key] = _Flight()
+                    self.stats["outbound"] += 1
+                    break
+                self.stats["coalesced"] += 1
+
+            await trio.to_thread.run_sync(flight.done.wait, cancellable=True)
+            if flight.succeeded:
+                return flight.result
+            if flight.error is not None:
+                raise flight.error
+            # the leader was cancelled, try to take over
+
+        try:
+            flight.result = await fetch()
+            flight.succeeded = True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                if flight.succeeded and keep(flight.result):
+                    self._store(key, flight.result)
+            flight.done.set()
+
+        return flight.result
+
+    def report(self) -> dict[str, int]:
+        """request counts, duplicates are requests served without an
+        outbound call of their own
+        """
+        with self._lock:
+            report = dict(self.stats)
+        report["duplicates"] = report.get("coalesced", 0) + report.get("cache_hits", 0)
+        return report
+
+
+# shared by all data processors of the process
+coalescer = shared(RequestCoalescer())
@@ -2,8 +2,13 @@ from enum import Enum
 from entsoe.mappings import lookup_area
 import pandas as pd
 import string
+import time
 from typing import NamedTuple, Any
 
+from etl.energy_index import EnergyIndex
+from etl.events import EventLog
+from etl.pyramid import ResamplingPyramid
+
 
 class Country(NamedTuple):
     name: str = ""
@@ -12,6 +17,47 @@ class Country(NamedTuple):
     tz: str = ""
 
 
+class Freshness(NamedTuple):
+    fetched_at: float  # unix time the data was fetched from the api
+    data_end: pd.Timestamp | None = None  # last timestamp of the data
+
+    @staticmethod
+    def of(data_record, fetched_at=None) -> "Freshness":
+        index = getattr(data_record, "index", None)
+        return Freshness(
+            time.time() if fetched_at is None else fetched_at,
+            index.max() if isinstance(index, pd.DatetimeIndex) and len(index) else None,
+        )
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+
+# datasets with a resampling pyramid, built when they are added
+PYRAMID_KEYS = ("CURRENT_GENERATION_ENTSOE", "ACTUAL_TOTAL_LOAD_ENTSOE")
+# minimal bar width [px] when the resolution is chosen for a chart width
+BAR_WIDTH_PX = 4
+
+# seconds after which a dataset is revalidated with the api
+MAX_AGE = {
+    "CURRENT_GENERATION_ENTSOE": 15 * 60,
+    "ACTUAL_TOTAL_LOAD_ENTSOE": 15 * 60,
+    "TOTAL_FORECAST_ENTSOE": 60 * 60,
+    "RENEWABLES_FORECAST_ENTSOE": 60 * 60,
+    "CAPACITY_BY_SOURCE_ENTSOE": 24 * 60 * 60,
+    "RENEWABLE_SHARE_ENERGY_CHARTS": 6 * 60 * 60,
+}
+
+
+# seconds the retry of a dataset which failed repeatedly is delayed at most
+MAX_RETRY_DELAY = 24 * 60 * 60
+
+
+class Attempt(NamedTuple):
+    at: float  # unix time of the latest fetch attempt
+    failures: int  # failed attempts since the last success
+
+
 class Data:
     """a class which holds a data dict, and supports key look up by dot notation
     (on the class instance).
@@ -25,7 +71,16 @@ class Data:
     def __init__(self, country_code):
         self.__data = {}  # key: None for key in Data.name_keys()}
         self.country = country_code
-        self.warning = []
+        # warnings of the etl and of incomplete data, see etl.events
+        self.events = EventLog()
+        # key name: Freshness of the data record
+        self.freshness: dict[str, Freshness] = {}
+        # key name: latest fetch attempt of the data record
+        self.attempts: dict[str, Attempt] = {}
+        self._energy_indices: dict[str, EnergyIndex] = {}
+        self._pyramids: dict[str, ResamplingPyramid] = {}
+        # optional etl.query.QueryEngine to push aggregations down to
+        self.query_engine = None
 
     def __getattr__(self, name) -> Any:
         """supports dot notation to perform key look up on __data dict,
@@ -70,7 +125,7 @@ class Data:
             tz=lookup_area(new_code).tz,
         )
 
-    def add(self, key_name, data_record, country_code) -> None:
+    def add(self, key_name, data_record, country_code, freshness=None) -> None:
         if not all([char in string.ascii_letters + "_" for char in key_name]):
             raise ValueError("key name must only contain ascii letters or '_'")
 
@@ -80,10 +135,83 @@ class Data:
         # self.country.tz = tz
 
         self.__data.update({key_name: data_record})
+        self.freshness[key_name] = freshness or Freshness.of(data_record)
+        self._energy_indices.pop(key_name, None)
+        if key_name in PYRAMID_KEYS and not data_record.empty:
+            if key_name in self._pyramids:
+                self._pyramids[key_name].update(data_record)
+            else:
+                self._pyramids[key_name] = ResamplingPyramid(data_record)
+
+    def pyramid(self, key_name: str) -> ResamplingPyramid:
+        """15min, 30min, 1h and 1D means of the dataset"""
+        return self._pyramids[key_name]
+
+    def record_attempt(self, key_name: str, success: bool) -> None:
+        """a fetch of the key, successful if it committed new data"""
+        previous = self.attempts.get(key_name, Attempt(0.0, 0))
+        failures = 0 if success else previous.failures + 1
+        self.attempts[key_name] = Attempt(time.time(), failures)
+
+    def revalidate_at(self, key_name: str) -> float | None:
+        """unix time the key is due to be fetched again: its max age after
+        the fetch of the data and, after failed attempts, not before the
+        latest attempt plus a delay doubling per failure; None if neither
+        fetched nor attempted yet
+        """
+        max_age = MAX_AGE.get(key_name, 0)
+        due = []
+        if (freshness := self.freshness.get(key_name)) is not None:
+            due.append(freshness.fetched_at + max_age)
+        attempt = self.attempts.get(key_name)
+        if attempt is not None and attempt.failures:
+            delay = min(max_age * 2 ** (attempt.failures - 1), MAX_RETRY_DELAY)
+            due.append(attempt.at + delay)
+        # fresh data is never due, whatever failed before
+        return max(due) if due else None
+
+    def backing_off(self, key_name: str) -> bool:
+        """the latest attempt of the key failed and its retry is not due"""
+        attempt = self.attempts.get(key_name)
+        return (
+            attempt is not None
+            and attempt.failures > 0
+            and self.revalidate_at(key_name) > time.time()
+        )
+
+    def stale_keys(self) -> set[str]:
+        """fetched or attempted keys with a max age which are due to be
+        fetched again
+        """
+        now = time.time()
+        return {
+            key_name
+            for key_name in MAX_AGE
+            if (due := self.revalidate_at(key_name)) is not None and due <= now
+        }
+
+    def nbytes(self) -> int:
+        """memory of the data records, their resampling pyramids and energy
+        indices in bytes
+        """
+        return (
+            sum(
+                int(record.memory_usage(deep=True).sum())
+                if isinstance(record, pd.DataFrame)
+                else int(record.memory_usage(deep=True))
+                for record in self.__data.values()
+            )
+            + sum(pyramid.nbytes() for pyramid in self._pyramids.values())
+            + sum(index.nbytes() for index in self._energy_indices.values())
+        )
 
     def set_country(self, new_country_code) -> None:
         self.__data = {}
-        self.warnings: list[str] = []
+        self.freshness = {}
+        self.attempts = {}
+        self._energy_indices = {}
+        self._pyramids = {}
+        self.events = EventLog()
         self.country = new_country_code
 
     @staticmethod
@@ -93,6 +221,54 @@ class Data:
         except KeyError:
             return df.unstack()
 
+    def generation_by_source(self) -> pd.DataFrame:
+        return self.CURRENT_GENERATION_ENTSOE.stack(level=0).pipe(Data.custom_unstack)
+
+    def energy_index(self) -> EnergyIndex:
+        """prefix sum index of the generation by source, built once per
+        (country, data record) and reused for every window
+        """
+        key_name = Data.name_keys().CURRENT_GENERATION_ENTSOE.name
+        if key_name not in self._energy_indices:
+            self._energy_indices[key_name] = EnergyIndex(self.generation_by_source())
+        return self._energy_indices[key_name]
+
+    def energy_by_source(self, start, end) -> pd.Series:
+        """generated energy [MWh] per source in the window [start, end)"""
+        if Data.name_keys().CURRENT_GENERATION_ENTSOE.name not in self.keys():
+            return pd.Series(dtype="float64")
+        return self.energy_index().energy(start, end)
+
+    def capacity_factor_by_source(self, start, end) -> pd.DataFrame:
+        """mean generation, installed capacity and capacity factor per source
+        for any window [start, end), e.g. an hour, a day, a week or a month
+        """
+        if not all(
+            [
+                Data.name_keys().CAPACITY_BY_SOURCE_ENTSOE.name in self.keys(),
+                Data.name_keys().CURRENT_GENERATION_ENTSOE.name in self.keys(),
+            ]
+        ):
+            return pd.DataFrame()
+
+        capacity = self.CAPACITY_BY_SOURCE_ENTSOE.iloc[0]
+        mean_power = (
+            self.query_engine.mean_by_source(self.country.code, start, end)
+            if self.query_engine is not None
+            else self.energy_index().mean_power(start, end)
+        )
+        return (
+            pd.concat(
+                [
+                    mean_power.rename("Mean Aggregated"),
+                    capacity.rename("capacity"),
+                ],
+                axis=1,
+            )
+            .assign(CF=lambda d: d["Mean Aggregated"] / d["capacity"])
+            .sort_values(by=["capacity"], ascending=False)
+        )
+
     def daily_capacity_factor_by_source(self) -> tuple[str, pd.DataFrame]:
         df_installed_capacity_key = Data.name_keys().CAPACITY_BY_SOURCE_ENTSOE.name
         df_current_generation_key = Data.name_keys().CURRENT_GENERATION_ENTSOE.name
@@ -128,25 +304,25 @@ class Data:
         )
         return (
             annotation,
-            pd.concat(
-                [
-                    self.CURRENT_GENERATION_ENTSOE.stack(level=0)
-                    # .unstack()["Actual Aggregated"]
-                    .pipe(Data.custom_unstack)
-                    .loc[start_time:end_time, condition]
-                    .mean()
-                    .to_frame()
-                    .set_axis(["Daily Mean Aggregated"], axis="columns"),
-                    self.CAPACITY_BY_SOURCE_ENTSOE.set_axis(["capacity"]).T,
-                ],
-                axis=1,
+            self.capacity_factor_by_source(start_time, end_time)
+            .rename(columns={"Mean Aggregated": "Daily Mean Aggregated"})
+            .assign(
+                **{
+                    "Daily Mean Aggregated": lambda d: d["Daily Mean Aggregated"].where(
+                        d.index.isin(condition[condition].index)
+                    )
+                }
             )
-            .sort_values(by=["capacity"], ascending=False)
             .assign(CF_Day=lambda d: d["Daily Mean Aggregated"] / d["capacity"])
+            .drop(columns="CF")
             .fillna(0),
         )
 
-    def current_gen_by_source(self):
+    def current_gen_by_source(self, start=None, end=None, width_px=None):
+        """generation by source and the forecasts (FC_Solar_Wind, FC_Other)
+        as 30 minute means or, given the visible window [start, end) and the
+        width of the chart, in the finest resolution that fits
+        """
         if not all(
             [
                 Data.name_keys().CURRENT_GENERATION_ENTSOE.name in self.keys(),
@@ -156,33 +332,34 @@ class Data:
         ):
             return pd.DataFrame()
 
-        return (
-            pd.merge(
-                self.CURRENT_GENERATION_ENTSOE.stack(level=0).pipe(Data.custom_unstack),
-                # .unstack()["Actual Aggregated"],
-                # .assign(Total_Aggregated=lambda d: d.sum(axis=1)),
-                self.TOTAL_FORECAST_ENTSOE.rename(
-                    columns={"Actual Aggregated": "Total"}
-                )
-                .loc[
-                    self.TOTAL_FORECAST_ENTSOE.index
-                    > self.CURRENT_GENERATION_ENTSOE.index[-1]
-                ]
-                .join(self.RENEWABLES_FORECAST_ENTSOE, how="left")
-                .assign(
-                    FC_Other=self.TOTAL_FORECAST_ENTSOE["Actual Aggregated"]
-                    - self.RENEWABLES_FORECAST_ENTSOE.sum(axis=1)
-                )
-                .assign(FC_Solar_Wind=self.RENEWABLES_FORECAST_ENTSOE.sum(axis=1))
-                .loc[:, ["FC_Solar_Wind", "FC_Other"]],
-                how="outer",
-                left_index=True,
-                right_index=True,
-            )
-            .fillna(0)
-            .resample("30Min")
-            .mean()
+        pyramid = self.pyramid("CURRENT_GENERATION_ENTSOE")
+        freq = (
+            pyramid.resolution_for(start, end, width_px, BAR_WIDTH_PX)
+            if width_px
+            else "30min"
         )
+        return pd.merge(
+            pyramid.level(freq).stack(level=0).pipe(Data.custom_unstack),
+            # .unstack()["Actual Aggregated"],
+            # .assign(Total_Aggregated=lambda d: d.sum(axis=1)),
+            self.TOTAL_FORECAST_ENTSOE.rename(columns={"Actual Aggregated": "Total"})
+            .loc[
+                self.TOTAL_FORECAST_ENTSOE.index
+                > self.CURRENT_GENERATION_ENTSOE.index[-1]
+            ]
+            .join(self.RENEWABLES_FORECAST_ENTSOE, how="left")
+            .assign(
+                FC_Other=self.TOTAL_FORECAST_ENTSOE["Actual Aggregated"]
+                - self.RENEWABLES_FORECAST_ENTSOE.sum(axis=1)
+            )
+            .assign(FC_Solar_Wind=self.RENEWABLES_FORECAST_ENTSOE.sum(axis=1))
+            .loc[:, ["FC_Solar_Wind", "FC_Other"]]
+            .resample(freq)
+            .mean(),
+            how="outer",
+            left_index=True,
+            right_index=True,
+        ).fillna(0)
 
     def total_load_distribution(self):
         if Data.name_keys().ACTUAL_TOTAL_LOAD_ENTSOE.name not in self.keys():
@@ -240,16 +417,13 @@ class Data:
         start_time = end_time - pd.Timedelta(days=1)
         total_capacity = self.CAPACITY_BY_SOURCE_ENTSOE.sum(axis=1)
 
+        hourly_generation = self.pyramid("CURRENT_GENERATION_ENTSOE").level("1h")
         hourly_mean_aggregated = (
-            (
-                self.CURRENT_GENERATION_ENTSOE.stack(level=0)
-                # .unstack()["Actual Aggregated"]
-                .pipe(Data.custom_unstack)
-                .loc[start_time:end_time]
-                .assign(Total=self.CURRENT_GENERATION_ENTSOE.sum(axis=1))
-            )
-            .resample("1H")
-            .mean()
+            hourly_generation.stack(level=0)
+            # .unstack()["Actual Aggregated"]
+            .pipe(Data.custom_unstack)
+            .loc[start_time:end_time]
+            .assign(Total=hourly_generation.sum(axis=1))
         )
 
         # if entsoe data is missing for any source:
@@ -258,8 +432,7 @@ class Data:
                 "Current Generation Data obtained from the entsoe transparency platform is incomplete, "
                 + "use visualized data with caution ..."
             )
-            if warning not in self.warning:
-                self.warning.append(warning)
+            self.events.add(warning, "CURRENT_GENERATION_ENTSOE", self.country.code)
 
         # approach with hourly averaged values ... maybe better to change to given timestep size averaged values
         total_aggregated_yesterday = (
@@ -278,9 +451,9 @@ class Data:
         start_time = end_time - pd.Timedelta(days=1)
 
         hourly_mean_aggregated = (
-            (self.ACTUAL_TOTAL_LOAD_ENTSOE.loc[start_time:end_time])
-            .resample("1H")
-            .mean()
+            self.pyramid("ACTUAL_TOTAL_LOAD_ENTSOE")
+            .level("1h")
+            .loc[start_time:end_time]
         )
 
         # approach with hourly averaged values ... maybe better to change to given timestep size averaged values
@@ -332,12 +505,12 @@ class Data:
         ]
 
         return (
-            self.CURRENT_GENERATION_ENTSOE.stack(level=0)
+            self.pyramid("CURRENT_GENERATION_ENTSOE")
+            .level("1h")
+            .stack(level=0)
             # .unstack()["Actual Aggregated"]
             .pipe(Data.custom_unstack)
             .loc[start_time:end_time][columns_to_sum]
-            .resample("1H")
-            .mean()
             .sum()
             .sum()
             / 10**6
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+# steps around a step whose median is the typical step there
+TYPICAL_STEPS = 9
+
+
+class EnergyIndex:
+    """cumulative energy (prefix sums) per column over the native time grid
+    of a power frame [MW], to answer energy, mean power and capacity factor
+    for arbitrary windows without touching the rows inside the window.
+
+    Gap handling: a missing value (NaN) contributes neither energy nor
+    covered time, a hole in the time grid (a step larger than 1.5 times the
+    typical step around it) is counted with the typical step only. The
+    typical step is the median of the surrounding steps, so that a change
+    of the resolution (e.g. from hourly to 15 minute data) is not taken for
+    holes. Mean power is therefore the mean over the covered time of the
+    window.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = df.columns
+        self.tz = df.index.tz if isinstance(df.index, pd.DatetimeIndex) else None
+        self._times = df.index.as_unit("ns").asi8 if len(df) else np.array([], "i8")
+
+        steps = np.diff(self._times)
+        self.step = int(np.median(steps)) if len(steps) else 0
+        typical = (
+            pd.Series(steps)
+            .rolling(TYPICAL_STEPS, center=True, min_periods=1)
+            .median()
+            .to_numpy()
+        )
+        hours = np.where(steps > 1.5 * typical, typical, steps)
+        # the last row lasts a typical step
+        hours = np.append(hours, typical[-1] if len(steps) else 0) / 3.6e12
+        hours[hours <= 0] = 0.0  # tolerate duplicate timestamps
+
+        values = df.to_numpy(dtype="f8", na_value=np.nan)
+        valid = ~np.isnan(values)
+        zeros = np.zeros((1, values.shape[1]))
+        self._energy = np.vstack(
+            [zeros, np.cumsum(np.where(valid, values, 0.0) * hours[:, None], axis=0)]
+        )  # MWh
+        self._covered = np.vstack(
+            [zeros, np.cumsum(valid * hours[:, None], axis=0)]
+        )  # h
+
+        # a regular grid allows to locate the window bounds arithmetically
+        self._regular = len(steps) > 0 and bool((steps == self.step).all())
+
+    def nbytes(self) -> int:
+        """memory of the prefix sums and timestamps in bytes"""
+        return self._times.nbytes + self._energy.nbytes + self._covered.nbytes
+
+    def __len__(self):
+        return len(self._times)
+
+    def _position(self, timestamp) -> int:
+        t = pd.Timestamp(timestamp)
+        if t.tzinfo is None and self.tz is not None:
+            t = t.tz_localize(self.tz)
+        t = t.as_unit("ns").value
+        if self._regular:
+            position = -(-(t - self._times[0]) // self.step)  # ceil division
+            return int(min(max(position, 0), len(self._times)))
+        return int(np.searchsorted(self._times, t, side="left"))
+
+    def _window(self, start, end) -> tuple[int, int]:
+        return self._position(start), self._position(end)
+
+    def energy(self, start, end) -> pd.Series:
+        """energy [MWh] per column in the window [start, end)"""
+        i0, i1 = self._window(start, end)
+        return pd.Series(self._energy[i1] - self._energy[i0], index=self.columns)
+
+    def covered_hours(self, start, end) -> pd.Series:
+        """hours with valid data per column in the window [start, end)"""
+        i0, i1 = self._window(start, end)
+        return pd.Series(self._covered[i1] - self._covered[i0], index=self.columns)
+
+    def coverage(self, start, end) -> pd.Series:
+        """share of the window [start, end) covered with valid data"""
+        hours = (pd.Timestamp(end) - pd.Timestamp(start)) / pd.Timedelta(hours=1)
+        return self.covered_hours(start, end) / max(hours, 1e-9)
+
+    def mean_power(self, start, end) -> pd.Series:
+        """mean power [MW] per column over the covered part of [start, end)"""
+        hours = self.covered_hours(start, end)
+        return self.energy(start, end).div(hours.where(hours > 0))
+
+    def capacity_factor(self, start, end, capacity: pd.Series) -> pd.Series:
+        """mean power relative to the installed capacity [MW] per column"""
+        return self.mean_power(start, end).div(capacity.reindex(self.columns))
@@ -1,36 +1,110 @@
 import collections
+import contextlib
+import functools
 from entsoe.parsers import parse_generation
 from entsoe.mappings import lookup_area
 import pandas as pd
 
 # import asyncio
 import httpx
-import json
+import numpy as np
 import pathlib
+import threading
 import trio
 
 import os
+import time
 # import streamlit as st
 
-from dotenv import load_dotenv
+try:
+    from orjson import loads as json_loads
+except ImportError:  # optional, faster json parser
+    from json import loads as json_loads
 import logging
-from etl.data import Data, Country
+from etl.data import Data, Country, MAX_AGE
+from etl.coalesce import coalescer
+from etl.archive import ResponseArchive
+from etl.rate_limit import get_limiter
+from etl.cache import get_cache, get_cache_writer, history_key
+from etl.query import QueryEngine
+from etl import memory
+from etl.forecast_accuracy import forecast_accuracy
 
 logger = logging.getLogger("app_logger")
 
 cfd = pathlib.Path(__file__).parent
 
+# memory budget [bytes] of the per country data kept by a DataProcessor
+DATA_MEMORY_BUDGET = int(os.getenv("DATA_MEMORY_BUDGET", 256 * 2**20))
+
 RequestParams = collections.namedtuple("RequestParams", ["key", "url", "params"])
 
+ENTSOE_API = "https://web-api.tp.entsoe.eu/api"
+ENERGY_CHARTS_API = "https://api.energy-charts.info"
+
+# document parameters of the ENTSO-E data keys, domains set to None are filled
+# with the long code of the country (default is Germany: '10Y1001A1001A83F')
+ENTSOE_DOCUMENTS = {
+    "ACTUAL_TOTAL_LOAD_ENTSOE": {
+        "documentType": "A65",  # System total load
+        "ProcessType": "A16",  # Realised
+        "outBiddingZone_Domain": None,
+    },
+    "CURRENT_GENERATION_ENTSOE": {
+        "documentType": "A75",  # 'A75': 'Actual generation per type',
+        "ProcessType": "A16",
+        "in_Domain": None,
+    },
+    "CAPACITY_BY_SOURCE_ENTSOE": {
+        "documentType": "A68",  # Installed generation per type
+        "ProcessType": "A33",
+        "in_Domain": None,
+    },
+    "TOTAL_FORECAST_ENTSOE": {
+        "documentType": "A71",  # Generation forecast,
+        "ProcessType": "A01",  # Day ahead
+        "in_Domain": None,
+    },
+    "RENEWABLES_FORECAST_ENTSOE": {
+        "documentType": "A69",  # Wind and solar forecast
+        "ProcessType": "A01",  # Forecast
+        "in_Domain": None,
+    },
+}
+
+# the ENTSO-E api answers at most one year per request
+ENTSOE_MAX_PERIOD = pd.Timedelta(days=365)
+
+# deadlines [s] of a single pipeline (including retries) and of run_etl
+PIPELINE_TIMEOUT = float(os.getenv("PIPELINE_TIMEOUT", 30))
+ETL_TIMEOUT = float(os.getenv("ETL_TIMEOUT", 15))
+# attempts per api request
+RETRIES = 3
+
+
+def split_period(start, end, window: pd.Timedelta) -> list[tuple]:
+    """consecutive windows [start, end) of at most `window` length"""
+    bounds = list(pd.date_range(start, end, freq=window))
+    if not bounds or bounds[-1] < end:
+        bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
 
 class DataPipeline:
     def __init__(
         self,
         processor,
         request_params=None,
+        merge=False,
+        retries=RETRIES,
     ):
         self.processor: DataProcessor = processor
         self.api_params: RequestParams = request_params
+        # merge into the history of the key instead of replacing the live
+        # dataset (backfill)
+        self.merge: bool = merge
+        # attempts per request
+        self.retries: int = retries
         self.id: str = self.api_params.key.name if request_params else "read_instant"
         self.country: Country = self.processor.data.country
         self.warnings: list[str] = []
@@ -45,17 +119,28 @@ class DataPipeline:
             ),  # Dummy request for context
         )
 
-    async def extract(self, client: httpx.AsyncClient, retries: int) -> httpx.Response:
-        if not self.api_params:
+    async def extract(
+        self, client: httpx.AsyncClient, retries: int, request_params=None
+    ) -> httpx.Response:
+        request_params = request_params or self.api_params
+        if not request_params:
             logger.debug("no request params")
             raise ValueError("no request parameters provided for extraction")
 
         logger.debug(f"{self.api_params.key.name} starts")
 
+        # shared per api host and security token by all pipelines
+        limiter = get_limiter(
+            httpx.URL(request_params.url).host,
+            request_params.params.get("securityToken", ""),
+        )
+
         for attempt in range(1, retries + 1):
+            if limiter:
+                await limiter.acquire()
             try:
                 response = await client.get(
-                    url=self.api_params.url, params=self.api_params.params
+                    url=request_params.url, params=request_params.params
                 )
 
             except httpx.RequestError as e:
@@ -80,10 +165,64 @@ class DataPipeline:
 
         return response
 
+    @staticmethod
+    def parse_days(days: list[str]) -> pd.DatetimeIndex:
+        """vectorized parsing of "%d.%m.%Y" dates (in ns, whatever the default
+        unit of the pandas version)
+        """
+        chars = np.asarray(days, dtype="U10").view("U1").reshape(len(days), 10)
+        if not (chars[:, 2] == ".").all() or not (chars[:, 5] == ".").all():
+            return pd.DatetimeIndex(pd.to_datetime(days, format="%d.%m.%Y")).as_unit(
+                "ns"
+            )
+        # reorder the characters to iso dates: YYYY-mm-dd
+        iso = chars[:, [6, 7, 8, 9, 2, 3, 4, 5, 0, 1]].copy()
+        iso[:, [4, 7]] = "-"
+        return pd.DatetimeIndex(
+            iso.view("U10").ravel().astype("datetime64[D]")
+        ).as_unit("ns")
+
+    @staticmethod
+    def parse_energy_charts(content: bytes, tz: str) -> pd.DataFrame:
+        """frame of an Energy-Charts json response built from numpy arrays,
+        indexed by its unix seconds or (first key) daily dates
+        """
+        data = json_loads(content)
+        if "unix_seconds" in data:
+            index = pd.to_datetime(
+                np.asarray(data.pop("unix_seconds"), dtype="i8"), unit="s", utc=True
+            ).tz_convert(tz)
+        else:
+            days = data.pop(list(data.keys())[0])  # rely on dict order
+            index = DataPipeline.parse_days(days).tz_localize(tz)
+
+        return pd.DataFrame(
+            {name: DataPipeline.to_array(values) for name, values in data.items()},
+            index=index,
+        )
+
+    @staticmethod
+    def to_array(values):
+        """float array of a list of numbers (None as NaN), other values as is"""
+        if not isinstance(values, list):
+            return values
+        try:
+            return np.asarray(values, dtype="f8")
+        except (TypeError, ValueError):
+            return values
+
     def transform(self, raw_data) -> pd.DataFrame:
-        if not raw_data or not raw_data.is_success:
-            return pd.DataFrame()
         key_name = self.id
+        if raw_data is None or not raw_data.is_success:
+            # status 0: the request failed, its warning was recorded in extract
+            if raw_data is not None and raw_data.status_code:
+                warning = (
+                    f"{key_name}: api responded {raw_data.status_code} "
+                    f"{raw_data.reason_phrase}"
+                )
+                logger.debug(warning)
+                self.warnings.append(warning)
+            return pd.DataFrame()
 
         try:
             if "ENTSOE" in self.api_params.key.name:
@@ -101,14 +240,7 @@ class DataPipeline:
                     logger.info(f"parsing entsoe data was not possible: {e}")
                     df = pd.DataFrame()
             else:
-                data = json.loads(raw_data.text)
-                index = data.pop(list(data.keys())[0])  # rely on dict order
-                df = pd.DataFrame(
-                    data,
-                    index=pd.DatetimeIndex(
-                        pd.to_datetime(index, format="%d.%m.%Y")
-                    ).tz_localize(self.country.tz),
-                )
+                df = self.parse_energy_charts(raw_data.content, self.country.tz)
 
         except (ValueError, AttributeError):
             warning = f"no {key_name} data available"
@@ -123,190 +255,564 @@ class DataPipeline:
         key_name = self.api_params.key.name
         country_code = self.country.code.upper()
 
-        await self.processor.add_data(key_name, df, country_code, self.warnings)
+        if self.merge:
+            # backfill: the history, the live dataset is left untouched
+            await self.processor.add_history(key_name, df, country_code)
+            return
+
+        df, ticket = await self.processor.add_data(
+            key_name, df, country_code, self.warnings
+        )
 
-        # save as instant data
+        # save as instant data, off the event loop; the ticket drops the write
+        # if a dataset committed later was written first
         key_name = self.api_params.key.name
         if not df.empty:
-            df.to_pickle(f"{cfd / 'tmp'}/{key_name}_{country_code}.pkl")
+            await trio.to_thread.run_sync(
+                self.processor.cache_writer.write, key_name, country_code, df, ticket
+            )
+            # compare the stored forecasts with the new actuals
+            if self.processor.forecast_accuracy is not None:
+                await trio.to_thread.run_sync(
+                    self.processor.forecast_accuracy.observe,
+                    key_name,
+                    country_code,
+                    df,
+                )
+
+    def split_request(self) -> list[RequestParams]:
+        """requests of maximal allowed length covering the requested period"""
+        params = self.api_params.params
+        if "periodStart" not in params:
+            return [self.api_params]
+
+        start = DataProcessor.parse_entsoe_date(params["periodStart"])
+        end = DataProcessor.parse_entsoe_date(params["periodEnd"])
+        if end - start <= ENTSOE_MAX_PERIOD:
+            return [self.api_params]
+
+        return [
+            self.api_params._replace(
+                params={
+                    **params,
+                    "periodStart": DataProcessor.format_date_for_entsoe(window_start),
+                    "periodEnd": DataProcessor.format_date_for_entsoe(window_end),
+                }
+            )
+            for window_start, window_end in split_period(start, end, ENTSOE_MAX_PERIOD)
+        ]
 
-    async def run(self, client: httpx.AsyncClient) -> None:
-        extracted_data = await self.extract(client, retries=3)
-        transformed_data = self.transform(extracted_data)
-        await self.load(transformed_data)
+    async def fetch_window(
+        self, client: httpx.AsyncClient, request_params: RequestParams
+    ) -> pd.DataFrame:
+        extracted_data = await self.extract(client, self.retries, request_params)
+        if self.processor.archive and extracted_data.is_success:
+            await trio.to_thread.run_sync(
+                self.processor.archive.store,
+                request_params,
+                self.country.code,
+                extracted_data,
+                self.merge,
+            )
+        return self.transform(extracted_data)
+
+    async def fetch(self, client: httpx.AsyncClient) -> tuple[pd.DataFrame, list[str]]:
+        requests = self.split_request()
+        if len(requests) == 1:
+            return await self.fetch_window(client, requests[0]), self.warnings
+
+        # long periods: windows fetched concurrently and stitched in time order
+        frames = [pd.DataFrame()] * len(requests)
+
+        async def fetch_into(i, request_params):
+            frames[i] = await self.fetch_window(client, request_params)
 
-    def read_instant_data(self, path=cfd / "tmp"):
+        async with trio.open_nursery() as nursery:
+            for i, request_params in enumerate(requests):
+                nursery.start_soon(fetch_into, i, request_params)
+
+        frames = [frame for frame in frames if not frame.empty]
+        df = (
+            functools.reduce(DataProcessor.merge_frames, frames)
+            if frames
+            else pd.DataFrame()
+        )
+        return df, self.warnings
+
+    async def run(self, client: httpx.AsyncClient) -> pd.DataFrame:
+        """fetch, transform and load the data, returns the loaded frame"""
+        # identical requests of concurrent sessions share one fetch, failed
+        # or empty fetches are not kept for the next sessions
+        transformed_data, warnings = await self.processor.coalescer.run(
+            self.api_params,
+            functools.partial(self.fetch, client),
+            keep=lambda result: not result[1] and not result[0].empty,
+        )
+        self.warnings = list(warnings)
+        # shallow copy, the shared frame must not be altered by this session
+        df = transformed_data.copy(deep=False)
+        await self.load(df)
+        return df
+
+    def read_instant_data(self):
         country_code = self.processor.data.country.code
         logger.debug(f"load instant data {country_code}")
-        files = os.listdir(path)
-        pickle_files = [file for file in files if file.endswith(".pkl")]
-
-        for file_name in pickle_files:
-            if country_code.upper() not in file_name:
-                continue
-            if file_name.split("_" + country_code.upper())[0] not in [
-                key.name for key in Data.name_keys()
-            ]:
-                continue
-            file_path = os.path.join(path, file_name)
-            name = file_name.split("_" + country_code.upper())[0]
-            logger.debug(f"... loading {name}")
-
-            data = pd.read_pickle(file_path)
-            if not isinstance(data, pd.DataFrame):
-                data = data.to_frame()
 
-            self.processor.data.add(name, data, country_code)
+        for name, data in self.processor.cache.read_country(country_code).items():
+            logger.debug(f"... loading {name}")
+            self.processor.data.add(
+                name,
+                data,
+                country_code,
+                self.processor.cache.freshness(name, country_code),
+            )
+            self.processor.publish(name)
         logger.debug("finished loading instant data")
 
 
 class DataProcessor:
     """Handles the ETL process: Extract, Transform, and Load data"""
 
-    def __init__(self, country_code="DE"):
+    # http transport of the api clients, e.g. an offline stand-in for load
+    # tests (see etl.offline), None for the network
+    transport: httpx.AsyncBaseTransport | None = None
+
+    def __init__(self, country_code="DE", memory_budget=DATA_MEMORY_BUDGET):
         logging.debug("a new data processor is alive...")
-        self.data = Data(country_code.upper())
         self.data_lock = trio.Lock()
+        # backfilled history per (cache key, country) and the locks
+        # serializing its merges, see add_history
+        self.history: dict[tuple[str, str], pd.DataFrame] = {}
+        self.history_locks: collections.defaultdict = collections.defaultdict(trio.Lock)
+        self.coalescer = coalescer
+        # scores the forecasts with the actuals, None e.g. for replayed data
+        # (see etl.archive)
+        self.forecast_accuracy = forecast_accuracy
+        # optional archive of the raw responses, see etl.archive
+        self.archive = ResponseArchive.from_env()
+        self.cache = get_cache()
+        self.cache_writer = get_cache_writer()
+        self.query_engine = (
+            QueryEngine(self.cache)
+            if os.getenv("QUERY_ENGINE", "") == "duckdb"
+            else None
+        )
+        # recently selected countries, least recently used first: switching
+        # back to one of them is a pointer swap instead of a reload
+        self.memory_budget = memory_budget
+        self.countries: collections.OrderedDict[str, Data] = collections.OrderedDict()
+        self.data = self.new_data(country_code)
+        # completion events: version counter per data key, increased
+        # whenever new data for the key was committed
+        self.versions: collections.Counter = collections.Counter()
+        # state of the data keys in the last run_etl: "fresh" (not fetched),
+        # "backoff" (failed recently, not fetched), "running", "done",
+        # "failed", "timed out" or "cancelled"
+        self.status: dict[str, str] = {}
+        # seconds the pipelines of the data keys ran in the last run_etl
+        self.durations: dict[str, float] = {}
         # self.set_country_code(country_code)
+        # the etl of the current country completed (or passed its deadline)
         self.completed = False
+        # the dashboard runs the etl in a background thread (see start_etl)
+        # while its script thread renders: commits of data and reads for a
+        # render hold this lock
+        self.lock = threading.RLock()
+        self.etl_thread: threading.Thread | None = None
+        # trio token and cancel scope of the run in the etl thread
+        self.etl_cancel: tuple | None = None
         DataPipeline(self).read_instant_data()
-
-    async def add_data(self, key_name, df, country_code, warnings=[]) -> None:
+        memory.register(self)
+
+    async def add_data(
+        self, key_name, df, country_code, warnings=[]
+    ) -> tuple[pd.DataFrame, int]:
+        """commit new data to the data of its country (if still held),
+        returns the committed frame and the ticket of its cache write (in
+        commit order, see CacheWriter.ticket)
+        """
         async with self.data_lock:
-            if not df.empty:
-                self.data.add(
-                    key_name,
-                    df,
-                    country_code,
+            ticket = self.cache_writer.ticket()
+            with self.lock:
+                data = self.countries.get(country_code.upper())
+                if data is None:
+                    return df, ticket
+                if not df.empty:
+                    data.add(
+                        key_name,
+                        df,
+                        country_code,
+                    )
+                for warning in warnings:
+                    data.events.add(warning, key_name, country_code.upper())
+                if not warnings and not df.empty:
+                    data.events.resolve(key_name)
+                if data is self.data:
+                    self.publish(key_name)
+        return df, ticket
+
+    async def add_history(self, key_name, df, country_code) -> pd.DataFrame:
+        """merge backfilled data into the cached history of the key (see
+        etl.cache.history_key), merges and writes of a key and country are
+        serialized; returns the merged history
+        """
+        if df.empty:
+            return df
+        name, country_code = history_key(key_name), country_code.upper()
+        async with self.history_locks[(name, country_code)]:
+            history = self.history.get((name, country_code))
+            if history is None:
+                history = await trio.to_thread.run_sync(
+                    self.cache.read, name, country_code
                 )
-            self.data.warning.extend(warnings)
+            if history is not None:
+                df = self.merge_frames(history, df)
+            self.history[(name, country_code)] = df
+            await trio.to_thread.run_sync(
+                self.cache_writer.write, name, country_code, df
+            )
+        return df
+
+    @staticmethod
+    def merge_frames(df: pd.DataFrame, new_df: pd.DataFrame) -> pd.DataFrame:
+        """time ordered union of both frames, new values win on overlaps"""
+        merged = pd.concat([df, new_df])
+        return merged[~merged.index.duplicated(keep="last")].sort_index()
+
+    def publish(self, key_name: str) -> None:
+        self.versions[key_name] += 1
+
+    def versions_snapshot(self) -> dict[str, int]:
+        return dict(self.versions)
+
+    @staticmethod
+    def changed_keys(seen: dict[str, int] | None, current: dict[str, int]) -> set[str]:
+        """data keys with a new version since `seen` (all keys if None)"""
+        if seen is None:
+            return {key.name for key in Data.name_keys()}
+        return {key for key, version in current.items() if seen.get(key) != version}
 
     @staticmethod
     def format_date_for_entsoe(date: pd.Timestamp):
         return date.tz_convert("UTC").round(freq="h").strftime("%Y%m%d%H00")
 
+    @staticmethod
+    def parse_entsoe_date(date_str: str) -> pd.Timestamp:
+        return pd.to_datetime(date_str, format="%Y%m%d%H%M").tz_localize("UTC")
+
     @staticmethod
     def format_date_for_energy_charts(date: pd.Timestamp):
         date_str = date.strftime("%Y-%m-%dT%H:%M%z")
         return date_str[:-2] + ":" + date_str[-2:]
 
+    def new_data(self, country_code) -> Data:
+        data = Data(country_code.upper())
+        data.query_engine = self.query_engine
+        self.countries[data.country.code] = data
+        return data
+
     def set_country_code(self, country_code):
-        self.data.set_country(country_code.upper())
-        DataPipeline(self).read_instant_data()
-        self.completed = False
+        country_code = country_code.upper()
+        with self.lock:
+            if country_code in self.countries:
+                self.countries.move_to_end(country_code)
+                self.data = self.countries[country_code]
+                for key_name in self.data.keys():
+                    self.publish(key_name)
+            else:
+                self.data = self.new_data(country_code)
+                DataPipeline(self).read_instant_data()
+            self.evict()
+            self.completed = False
+
+    def evict(self) -> None:
+        """drop the least recently used countries until the data fits into
+        the memory budget, the current country is always kept
+        """
+        nbytes = {code: data.nbytes() for code, data in self.countries.items()}
+        while len(self.countries) > 1 and sum(nbytes.values()) > self.memory_budget:
+            code, _ = self.countries.popitem(last=False)
+            logger.debug(f"evicted {code} data ({nbytes.pop(code)} bytes)")
+
+    def request_params(self, key_name: str, start, end) -> RequestParams:
+        """request of the data key for the period [start, end)"""
+        key = Data.name_keys()[key_name]
+        if key_name == "RENEWABLE_SHARE_ENERGY_CHARTS":
+            return RequestParams(
+                key,
+                ENERGY_CHARTS_API + "/ren_share_daily_avg",
+                {"country": self.data.country.code.lower()},
+            )
+
+        return RequestParams(
+            key,
+            ENTSOE_API,
+            {
+                "securityToken": os.getenv("ENTSOE_API_KEY", ""),
+                "periodStart": self.format_date_for_entsoe(start),
+                "periodEnd": self.format_date_for_entsoe(end),
+                **{
+                    param: value or self.data.country.long_code
+                    for param, value in ENTSOE_DOCUMENTS[key_name].items()
+                },
+            },
+        )
 
-    async def run_etl(self) -> None:
-        entsoe_api = "https://web-api.tp.entsoe.eu/api"
-        energy_charts_api = "https://api.energy-charts.info"
+    def read_if_fresh(self, key_name: str) -> bool:
+        """True if the dataset is younger than its max age in memory or in
+        the cache (fetched by another session or process), the cached one
+        is committed
+        """
+        max_age = MAX_AGE.get(key_name, 0)
+        freshness = self.data.freshness.get(key_name)
+        if freshness is not None and freshness.age() <= max_age:
+            return True
+        country_code = self.data.country.code
+        freshness = self.cache.freshness(key_name, country_code)
+        if freshness is None or freshness.age() > max_age:
+            return False
+        if (df := self.cache.read(key_name, country_code)) is not None:
+            with self.lock:
+                self.data.add(key_name, df, country_code, freshness)
+                # fetched by someone else: the failures of this session are over
+                self.data.record_attempt(key_name, True)
+                self.publish(key_name)
+        return True
+
+    async def run_etl(
+        self,
+        timeout: float = ETL_TIMEOUT,
+        pipeline_timeout: float = PIPELINE_TIMEOUT,
+        partial: bool = True,
+        keys: list[str] | None = None,
+        retries: int = RETRIES,
+        force: bool = False,
+        limiter: trio.CapacityLimiter | None = None,
+    ) -> None:
+        """fetch the stale datasets (all with force) of the data keys (default
+        all) of the country. Every pipeline has its own deadline, datasets
+        are committed as soon as their pipeline finished; see watch_deadline
+        for the overall deadline. A limiter shared by several runs bounds
+        the pipelines running at once.
+        """
+        data = self.data
+        requests = self.planned_requests(keys)
+
+        # stale-while-revalidate: only the stale datasets are fetched, the
+        # dashboard shows the stale ones meanwhile
+        self.status = {}
+        self.durations = {}
+        if not force:
+            for request in requests:
+                if self.read_if_fresh(request.key.name):
+                    self.status[request.key.name] = "fresh"
+                elif self.data.backing_off(request.key.name):
+                    self.status[request.key.name] = "backoff"
+        requests = [
+            request for request in requests if request.key.name not in self.status
+        ]
 
+        async with httpx.AsyncClient(transport=self.transport) as httpx_client:
+            # with trio slightly faster than with asyncio
+            async with trio.open_nursery() as nursery:
+                watchdog = trio.CancelScope()
+                nursery.start_soon(
+                    self.watch_deadline,
+                    nursery.cancel_scope,
+                    watchdog,
+                    timeout,
+                    partial,
+                    data,
+                )
+                async with trio.open_nursery() as pipelines:
+                    for request in requests:
+                        self.status[request.key.name] = "running"
+                        pipelines.start_soon(
+                            self.run_pipeline,
+                            DataPipeline(self, request, retries=retries),
+                            httpx_client,
+                            pipeline_timeout,
+                            limiter,
+                            name=request.key.name,
+                        )
+                watchdog.cancel()
+
+        logger.debug(f"request coalescing: {self.coalescer.report()}")
+        logger.debug(f"etl status: {self.status}")
+        memory.memory_tracker.after_etl(f"run_etl {data.country.code}")
+        self.complete(data)
+
+    def complete(self, data: Data) -> None:
+        """the etl of data's country completed, unless the processor switched
+        to another country meanwhile
+        """
+        with self.lock:
+            if self.data is data:
+                self.completed = True
+
+    @property
+    def etl_running(self) -> bool:
+        return self.etl_thread is not None and self.etl_thread.is_alive()
+
+    def start_etl(self, instruments=(), **kwargs) -> bool:
+        """run run_etl (with kwargs) in a background thread, as the
+        prefetcher does, so that the caller (the dashboard's script thread)
+        can render the datasets as they are committed. At most one run per
+        processor; returns False if one is still running.
+        """
+        with self.lock:
+            if self.etl_running:
+                return False
+            self.completed = False
+            self.etl_thread = threading.Thread(
+                target=self._etl_thread,
+                args=(self.data, list(instruments), kwargs),
+                name=f"etl {self.data.country.code}",
+                daemon=True,
+            )
+            self.etl_thread.start()
+        return True
+
+    def _etl_thread(self, data: Data, instruments: list, kwargs: dict) -> None:
+        async def run() -> None:
+            with trio.CancelScope() as scope:
+                self.etl_cancel = (trio.lowlevel.current_trio_token(), scope)
+                await self.run_etl(**kwargs)
+
+        try:
+            trio.run(run, instruments=instruments)
+        except Exception as e:
+            logger.error(f"etl of {data.country.code} failed: {e!r}")
+        finally:
+            self.etl_cancel = None
+            # also after a failure: stale keys are retried with backoff
+            self.complete(data)
+
+    def cancel_etl(self) -> None:
+        """cancel the run in the background thread, if any (e.g. of the
+        previous country after a switch)
+        """
+        if (etl_cancel := self.etl_cancel) is None:
+            return
+        token, scope = etl_cancel
+        with contextlib.suppress(trio.RunFinishedError):
+            trio.from_thread.run_sync(scope.cancel, trio_token=token)
+
+    def planned_requests(self, keys: list[str] | None = None) -> list[RequestParams]:
+        """requests of the data keys (default all) of the country: yesterday
+        until now and the forecasts of the next 24 hours
+        """
         end = pd.Timestamp.today(tz=lookup_area(self.data.country.code).tz)  # now
         start = end.floor("D") - pd.Timedelta(days=1)  # begin of yesterday(00:00)
 
         requests = [
             # RequestParams(
             #     Data.name_keys().CURRENT_GENERATION_ENERGY_CHARTS,
-            #     energy_charts_api + "/total_power",
+            #     ENERGY_CHARTS_API + "/total_power",
             #     {"country": self.data.country.code.lower() ,"start": self.format_date_for_energy_charts(start), "end":self.format_date_for_energy_charts(end)}
             # ),
             # RequestParams(
             #     Data.name_keys().CAPACITY_BY_SOURCE_ENERGY_CHARTS,
-            #     energy_charts_api + "/installed_power",
+            #     ENERGY_CHARTS_API + "/installed_power",
             #     {"country": self.data.country.code.lower(), "time_step": "yearly", "installation_commission":False}
             # ),
-            RequestParams(
-                Data.name_keys().ACTUAL_TOTAL_LOAD_ENTSOE,
-                entsoe_api,
-                {
-                    "securityToken": os.getenv("ENTSOE_API_KEY", ""),
-                    "periodStart": self.format_date_for_entsoe(start),
-                    "periodEnd": self.format_date_for_entsoe(end),
-                    "documentType": "A65",  # System total load
-                    "ProcessType": "A16",  # Realised
-                    "outBiddingZone_Domain": self.data.country.long_code,
-                },
-            ),
-            RequestParams(
-                Data.name_keys().RENEWABLE_SHARE_ENERGY_CHARTS,
-                energy_charts_api + "/ren_share_daily_avg",
-                {"country": self.data.country.code.lower()},
+            self.request_params("ACTUAL_TOTAL_LOAD_ENTSOE", start, end),
+            self.request_params("RENEWABLE_SHARE_ENERGY_CHARTS", start, end),
+            self.request_params("CURRENT_GENERATION_ENTSOE", start, end),
+            self.request_params("CAPACITY_BY_SOURCE_ENTSOE", start, end),
+            # forecasts: the next 24 hours
+            self.request_params(
+                "TOTAL_FORECAST_ENTSOE", end, end + pd.Timedelta(hours=24)
             ),
-            RequestParams(
-                Data.name_keys().CURRENT_GENERATION_ENTSOE,
-                entsoe_api,
-                {
-                    "securityToken": os.getenv("ENTSOE_API_KEY", ""),
-                    "periodStart": self.format_date_for_entsoe(start),
-                    "periodEnd": self.format_date_for_entsoe(end),
-                    "documentType": "A75",  # 'A75': 'Actual generation per type',
-                    "ProcessType": "A16",
-                    "in_Domain": self.data.country.long_code,  # default is Germany: '10Y1001A1001A83F'
-                },
-            ),
-            RequestParams(
-                Data.name_keys().CAPACITY_BY_SOURCE_ENTSOE,
-                entsoe_api,
-                {
-                    "securityToken": os.getenv("ENTSOE_API_KEY", ""),
-                    "periodStart": self.format_date_for_entsoe(start),
-                    "periodEnd": self.format_date_for_entsoe(end),
-                    "documentType": "A68",  # Installed generation per type
-                    "ProcessType": "A33",
-                    "in_Domain": self.data.country.long_code,  # default is Germany: '10Y1001A1001A83F'
-                },
-            ),
-            RequestParams(
-                Data.name_keys().TOTAL_FORECAST_ENTSOE,
-                entsoe_api,
-                {
-                    "securityToken": os.getenv("ENTSOE_API_KEY", ""),
-                    "periodStart": self.format_date_for_entsoe(end),
-                    "periodEnd": self.format_date_for_entsoe(
-                        end + pd.Timedelta(hours=24)
-                    ),
-                    "documentType": "A71",  # Generation forecast,
-                    "ProcessType": "A01",  # Day ahead
-                    "in_Domain": self.data.country.long_code,  # default is Germany: '10Y1001A1001A83F'
-                },
-            ),
-            RequestParams(
-                Data.name_keys().RENEWABLES_FORECAST_ENTSOE,
-                entsoe_api,
-                {
-                    "securityToken": os.getenv("ENTSOE_API_KEY", ""),
-                    "periodStart": self.format_date_for_entsoe(end),
-                    "periodEnd": self.format_date_for_entsoe(
-                        end + pd.Timedelta(hours=24)
-                    ),
-                    "documentType": "A69",  # 'A75': 'Actual generation per type',
-                    "ProcessType": "A01",  # Forecast
-                    "in_Domain": self.data.country.long_code,
-                },
+            self.request_params(
+                "RENEWABLES_FORECAST_ENTSOE", end, end + pd.Timedelta(hours=24)
             ),
         ]
+        if keys is not None:
+            requests = [request for request in requests if request.key.name in keys]
+        return requests
 
-        async with httpx.AsyncClient() as httpx_client:
-            # with trio slightly faster than with asyncio
-            async with trio.open_nursery() as nursery:
-                data_pipelines = [
-                    (
-                        DataPipeline(self, request).run,
-                        httpx_client,
-                        request.key.name,
+    async def run_pipeline(
+        self,
+        pipeline: DataPipeline,
+        client: httpx.AsyncClient,
+        timeout: float,
+        limiter: trio.CapacityLimiter | None = None,
+    ) -> None:
+        """run the pipeline within its deadline (from the time it got a slot
+        of the limiter, if any) and keep the key status and duration
+        """
+        key_name = pipeline.api_params.key.name
+        data = self.countries.get(pipeline.country.code)
+        fetched = data.freshness.get(key_name) if data is not None else None
+        try:
+            async with limiter or contextlib.nullcontext():
+                started = time.perf_counter()
+                try:
+                    with trio.move_on_after(timeout) as scope:
+                        df = await pipeline.run(client)
+                finally:
+                    self.durations[key_name] = time.perf_counter() - started
+            if scope.cancelled_caught:
+                self.status[key_name] = "timed out"
+                # the country of the pipeline, the processor may have
+                # switched to another one meanwhile
+                if data is not None:
+                    data.events.add(
+                        f"{key_name}: no response within {timeout:.0f}s",
+                        key_name,
+                        pipeline.country.code,
+                        "error",
                     )
-                    for request in requests
-                ]
-                for func, client, task_name in data_pipelines:
-                    nursery.start_soon(func, client, name=task_name)
+            else:
+                # failed requests and non 2xx responses leave a warning
+                failed = pipeline.warnings or df.empty
+                self.status[key_name] = "failed" if failed else "done"
+        finally:
+            if self.status.get(key_name) == "running":
+                self.status[key_name] = "cancelled"
+            # a run without new data (e.g. no token, no data of the zone) is
+            # retried with backoff instead of on every tick; a cancelled one
+            # (e.g. after a country switch) did not fail
+            if (
+                self.status[key_name] != "cancelled"
+                and (data := self.countries.get(pipeline.country.code)) is not None
+            ):
+                data.record_attempt(
+                    key_name,
+                    self.status[key_name] == "done"
+                    and data.freshness.get(key_name) is not fetched,
+                )
 
-        self.completed = True
+    async def watch_deadline(
+        self,
+        etl_scope: trio.CancelScope,
+        watchdog: trio.CancelScope,
+        timeout: float,
+        partial: bool,
+        data: Data,
+    ) -> None:
+        """at the overall deadline either complete with the datasets
+        committed so far while the others keep running until their own
+        deadline (partial: the dashboard renders the missing charts with
+        the data at hand), or cancel the unfinished pipelines
+        """
+        with watchdog:
+            await trio.sleep(timeout)
+            unfinished = [
+                key for key, state in self.status.items() if state == "running"
+            ]
+            logger.info(
+                f"etl deadline of {timeout:.0f}s passed, unfinished: {unfinished}"
+            )
+            if partial:
+                self.complete(data)
+            else:
+                etl_scope.cancel()
 
 
 if __name__ == "__main__":
-    load_dotenv("../.env")
-
-    async def main():
-        async with trio.open_nursery() as nursery:
-            nursery.start_soon(data_processor.run_etl)
+    # headless runs, see etl/cli.py
+    from etl.cli import main
 
-    data_processor = DataProcessor()
-    trio.run(main)
+    main()
@@ -0,0 +1,108 @@
+import collections
+import os
+import threading
+import time
+from typing import NamedTuple
+
+# entries kept by an event log, the oldest are dropped first
+EVENT_LOG_SIZE = int(os.getenv("EVENT_LOG_SIZE", 100))
+
+SEVERITIES = ("info", "warning", "error")
+
+
+class Event(NamedTuple):
+    key: str | None  # data key the event is about, None for general events
+    country: str | None
+    severity: str  # "info", "warning" or "error"
+    message: str
+    first_seen: float  # unix time
+    last_seen: float
+    count: int  # number of times the event occurred
+
+
+class EventLog:
+    """bounded log of the etl and data events of a country.
+
+    Repeated events are counted instead of stored again. The log keeps the
+    `size` most recently seen events, older ones are dropped. An event is
+    active until its data key is resolved (new data was committed) after
+    it was last seen; `version` changes whenever the active events change.
+    """
+
+    def __init__(self, size: int = EVENT_LOG_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        # (key, country, severity, message): Event, least recently seen first
+        self.events: collections.OrderedDict[tuple, Event] = collections.OrderedDict()
+        # key: unix time the key was last resolved
+        self.resolved: dict[str | None, float] = {}
+        # key: latest event of the key
+        self.latest: dict[str | None, Event] = {}
+        self.version = 0
+        self.dropped = 0
+
+    def add(
+        self,
+        message: str,
+        key: str | None = None,
+        country: str | None = None,
+        severity: str = "warning",
+    ) -> Event:
+        if severity not in SEVERITIES:
+            raise ValueError(f"unknown severity {severity!r}, use one of {SEVERITIES}")
+        now = time.time()
+        entry_id = (key, country, severity, message)
+        with self.lock:
+            event = self.events.pop(entry_id, None)
+            was_active = event is not None and self.is_active(event)
+            event = (
+                event._replace(last_seen=now, count=event.count + 1)
+                if event
+                else Event(key, country, severity, message, now, now, 1)
+            )
+            self.events[entry_id] = event
+            self.latest[key] = event
+            if len(self.events) > self.size:
+                self.events.popitem(last=False)
+                self.dropped += 1
+            if not was_active:
+                self.version += 1
+        return event
+
+    def resolve(self, key: str | None) -> None:
+        """the key is fine again, e.g. new data of the key was committed"""
+        with self.lock:
+            if (event := self.latest.get(key)) and self.is_active(event):
+                self.version += 1
+            self.resolved[key] = time.time()
+
+    def is_active(self, event: Event) -> bool:
+        return event.last_seen > self.resolved.get(event.key, float("-inf"))
+
+    def status(self, key: str | None) -> str:
+        """current state of the key: "ok" or, if its latest event is still
+        active, the severity of that event
+        """
+        with self.lock:
+            event = self.latest.get(key)
+            if event is None or not self.is_active(event):
+                return "ok"
+            return event.severity
+
+    def active(self, min_severity: str = "warning") -> list[Event]:
+        """unresolved events of at least the severity, oldest first"""
+        level = SEVERITIES.index(min_severity)
+        with self.lock:
+            return [
+                event
+                for event in self.events.values()
+                if SEVERITIES.index(event.severity) >= level and self.is_active(event)
+            ]
+
+    def entries(self) -> list[Event]:
+        """all kept events, least recently seen first"""
+        with self.lock:
+            return list(self.events.values())
+
+    def __len__(self) -> int:
+        return len(self.events)
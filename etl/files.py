@@ -0,0 +1,30 @@
+import contextlib
+import os
+import pathlib
+import tempfile
+
+
+def atomic_write(path, content: bytes | str, fsync: bool = False) -> None:
+    """replace the file at path with content: written to a temporary file
+    with a unique name in the same directory and renamed, so that readers
+    (and concurrent writers of other threads or processes) see either the
+    old or the new file
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(content, str):
+        content = content.encode()
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=f".{path.name}.", suffix=".tmp", dir=path.parent
+    )
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(content)
+            if fsync:
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import pathlib
+import threading
+
+import pandas as pd
+
+from etl.data import Data
+from etl.files import atomic_write
+from etl.memory import shared
+
+logger = logging.getLogger("app_logger")
+
+cfd = pathlib.Path(__file__).parent
+
+# forecasts and actuals are compared as hourly means
+RESOLUTION = "1h"
+# weight of an error halves every HALF_LIFE seconds (rolling statistics)
+HALF_LIFE = 7 * 24 * 60 * 60
+# actuals below this power [MW] are left out of the percentage error
+MAPE_MIN_ACTUAL = 1.0
+# unmatched forecasts older than this are dropped
+PENDING_MAX_AGE = pd.Timedelta(days=3)
+# state of the tracker of the process, e.g. a temporary file for load tests
+FORECAST_ACCURACY_PATH = os.getenv(
+    "FORECAST_ACCURACY_PATH", cfd / "tmp" / "forecast_accuracy.json"
+)
+
+
+class OnlineError:
+    """exponentially weighted mean absolute, relative and signed error of a
+    forecast, updated in O(1) per observation
+    """
+
+    fields = ("weight", "abs_error", "error", "pct_weight", "abs_pct_error", "updated")
+
+    def __init__(self, half_life: float = HALF_LIFE, **state):
+        self.half_life = half_life
+        self.weight = 0.0
+        self.abs_error = 0.0
+        self.error = 0.0
+        self.pct_weight = 0.0
+        self.abs_pct_error = 0.0
+        self.updated: float | None = None  # unix time of the latest observation
+        self.count = 0
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def update(self, t: float, forecast: float, actual: float) -> None:
+        if self.updated is None or t >= self.updated:
+            # decay the history to time t, the new observation has weight 1
+            if self.updated is not None:
+                decay = 0.5 ** ((t - self.updated) / self.half_life)
+                self.weight *= decay
+                self.abs_error *= decay
+                self.error *= decay
+                self.pct_weight *= decay
+                self.abs_pct_error *= decay
+            self.updated = t
+            weight = 1.0
+        else:
+            # late observation, weighted as if it had arrived in order
+            weight = 0.5 ** ((self.updated - t) / self.half_life)
+
+        error = forecast - actual
+        self.weight += weight
+        self.abs_error += weight * abs(error)
+        self.error += weight * error
+        if abs(actual) >= MAPE_MIN_ACTUAL:
+            self.pct_weight += weight
+            self.abs_pct_error += weight * abs(error) / abs(actual)
+        self.count += 1
+
+    @property
+    def mae(self) -> float:
+        return self.abs_error / self.weight if self.weight else float("nan")
+
+    @property
+    def bias(self) -> float:
+        return self.error / self.weight if self.weight else float("nan")
+
+    @property
+    def mape(self) -> float:
+        return (
+            100 * self.abs_pct_error / self.pct_weight
+            if self.pct_weight
+            else float("nan")
+        )
+
+    def state(self) -> dict:
+        return {name: getattr(self, name) for name in (*self.fields, "count")}
+
+
+class ForecastAccuracy:
+    """rolling accuracy of the day-ahead forecasts per country and series.
+
+    Forecasts (TOTAL_FORECAST_ENTSOE as "Total", RENEWABLES_FORECAST_ENTSOE
+    per source) are kept until the actual generation of their hours
+    arrives, then every matched hour updates the online statistics once.
+    Shared by all sessions of the process and persisted as json.
+    """
+
+    def __init__(self, path=FORECAST_ACCURACY_PATH):
+        self.path = pathlib.Path(path)
+        self.lock = threading.Lock()
+        # "country|series": OnlineError
+        self.stats: dict[str, OnlineError] = {}
+        # "country|series": {hour (unix seconds): forecast [MW]}
+        self.pending: dict[str, dict[int, float]] = {}
+        if self.path.exists():
+            state = json.loads(self.path.read_text())
+            self.stats = {
+                name: OnlineError(**stats) for name, stats in state["stats"].items()
+            }
+            self.pending = {
+                name: {int(t): value for t, value in forecasts.items()}
+                for name, forecasts in state["pending"].items()
+            }
+
+    def save(self) -> None:
+        state = {
+            "stats": {name: stats.state() for name, stats in self.stats.items()},
+            "pending": self.pending,
+        }
+        atomic_write(self.path, json.dumps(state))
+
+    @staticmethod
+    def hourly(df: pd.DataFrame) -> pd.DataFrame:
+        return df.resample(RESOLUTION).mean()
+
+    @staticmethod
+    def by_series(key_name: str, df: pd.DataFrame) -> pd.DataFrame:
+        """forecast or actual columns named by series: "Total" and sources"""
+        if key_name == "TOTAL_FORECAST_ENTSOE":
+            return df[["Actual Aggregated"]].set_axis(["Total"], axis=1)
+        if key_name == "CURRENT_GENERATION_ENTSOE":
+            generation = (
+                df.stack(level=0).pipe(Data.custom_unstack)
+                if isinstance(df.columns, pd.MultiIndex)
+                else df
+            )
+            # the total only of hours reported by all sources
+            total = generation.sum(axis=1).where(generation.notna().all(axis=1))
+            return generation.assign(Total=total)
+        return df
+
+    def observe(self, key_name: str, country_code: str, df: pd.DataFrame) -> None:
+        """store new forecasts or score the stored ones against new actuals"""
+        if df.empty or key_name not in (
+            "TOTAL_FORECAST_ENTSOE",
+            "RENEWABLES_FORECAST_ENTSOE",
+            "CURRENT_GENERATION_ENTSOE",
+        ):
+            return
+        series = self.hourly(self.by_series(key_name, df))
+        hours = series.index.tz_convert("UTC").asi8 // 10**9
+
+        with self.lock:
+            if key_name == "CURRENT_GENERATION_ENTSOE":
+                # the latest hour may not be complete yet
+                self.score(country_code, series.iloc[:-1], hours[:-1])
+            else:
+                for name in series.columns:
+                    forecasts = self.pending.setdefault(f"{country_code}|{name}", {})
+                    for t, value in zip(hours, series[name].to_numpy()):
+                        if value == value:  # not NaN
+                            forecasts[int(t)] = float(value)
+            self.prune(hours.max())
+            self.save()
+
+    def score(self, country_code: str, actuals: pd.DataFrame, hours) -> None:
+        for name in actuals.columns:
+            forecasts = self.pending.get(f"{country_code}|{name}")
+            if not forecasts:
+                continue
+            stats = self.stats.setdefault(f"{country_code}|{name}", OnlineError())
+            for t, actual in zip(hours, actuals[name].to_numpy()):
+                if actual != actual:  # NaN, not reported yet
+                    continue
+                if (forecast := forecasts.pop(int(t), None)) is not None:
+                    stats.update(float(t), forecast, float(actual))
+
+    def prune(self, now: int) -> None:
+        oldest = now - PENDING_MAX_AGE.total_seconds()
+        for forecasts in self.pending.values():
+            for t in [t for t in forecasts if t < oldest]:
+                del forecasts[t]
+
+    def report(self, country_code: str | None = None) -> pd.DataFrame:
+        """rolling mae [MW], mape [%], bias [MW] and matched hours per
+        country and series
+        """
+        with self.lock:
+            rows = [
+                {
+                    "country": name.split("|")[0],
+                    "series": name.split("|")[1],
+                    "mae": stats.mae,
+                    "mape": stats.mape,
+                    "bias": stats.bias,
+                    "hours": stats.count,
+                }
+                for name, stats in self.stats.items()
+                if country_code is None or name.startswith(f"{country_code.upper()}|")
+            ]
+        return pd.DataFrame(
+            rows, columns=["country", "series", "mae", "mape", "bias", "hours"]
+        )
+
+
+# shared by all data processors of the process
+forecast_accuracy = shared(ForecastAccuracy())
+
+
+if __name__ == "__main__":
+    with pd.option_context("display.max_rows", 200, "display.width", 200):
+        print(forecast_accuracy.report())
@@ -0,0 +1,176 @@
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+import weakref
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app_logger")
+
+# live data processors of the process (one per streamlit session)
+_processors: "weakref.WeakSet" = weakref.WeakSet()
+_processors_lock = threading.Lock()
+# process-wide objects referenced by the processors, see shared
+_shared: "weakref.WeakValueDictionary" = weakref.WeakValueDictionary()
+
+
+def register(processor) -> None:
+    with _processors_lock:
+        _processors.add(processor)
+
+
+def shared(obj):
+    """mark obj as process-wide (e.g. the cache or the request coalescer):
+    not counted by deep_size in the memory of the objects referencing it,
+    e.g. of every session; returns obj
+    """
+    with _processors_lock:
+        _shared[id(obj)] = obj
+    return obj
+
+
+def is_shared(obj) -> bool:
+    # by id: most objects deep_size walks are not hashable
+    return _shared.get(id(obj)) is obj
+
+
+def processors() -> list:
+    with _processors_lock:
+        return list(_processors)
+
+
+def deep_size(obj, seen: set | None = None) -> int:
+    """bytes held by obj: pandas objects with their (object) values, numpy
+    buffers and the items of containers and plain objects; objects
+    referenced several times are counted once, process-wide ones (see
+    shared) not at all
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen or is_shared(obj):
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (obj.nbytes if obj.base is None else 0)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(
+            deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items()
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and type(obj).__module__.startswith(
+        ("etl", "charts")
+    ):
+        # only objects of this project, others (e.g. streamlit elements)
+        # reference the whole runtime
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def data_report(data) -> dict:
+    """bytes of the data records, the event log, the resampling pyramids
+    and the energy indices of an etl.data.Data
+    """
+    return {
+        "country": data.country.code,
+        "keys": {key_name: deep_size(record) for key_name, record in data.items()},
+        "warnings": deep_size(data.events),
+        "warning_count": len(data.events),
+        "pyramids": sum(pyramid.nbytes() for pyramid in data._pyramids.values()),
+        "energy_indices": deep_size(data._energy_indices),
+    }
+
+
+def processor_report(processor) -> dict:
+    """memory of all countries held by a DataProcessor"""
+    countries = [data_report(data) for data in list(processor.countries.values())]
+    return {
+        "current_country": processor.data.country.code,
+        "countries": countries,
+        "total": sum(
+            sum(report["keys"].values())
+            + report["warnings"]
+            + report["pyramids"]
+            + report["energy_indices"]
+            for report in countries
+        ),
+    }
+
+
+def session_report(session_state) -> dict[str, int]:
+    """bytes per entry of a streamlit session state"""
+    return {str(key): deep_size(value) for key, value in session_state.items()}
+
+
+def memory_report() -> dict:
+    """memory of all live data processors and the process rss"""
+    reports = [processor_report(processor) for processor in processors()]
+    return {
+        "rss": rss(),
+        "processors": reports,
+        "total": sum(report["total"] for report in reports),
+        "tracemalloc": memory_tracker.diffs,
+    }
+
+
+def rss() -> int | None:
+    """current resident set size in bytes (linux), None if unknown"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class MemoryTracker:
+    """tracemalloc snapshot diffs between etl runs, enabled with
+    MEMORY_TRACE=1 (tracing slows down allocations)
+    """
+
+    def __init__(self, enabled: bool = False, frames: int = 1, top: int = 15):
+        self.enabled = enabled
+        self.frames = frames
+        self.top = top
+        self.lock = threading.Lock()
+        self.snapshot: tracemalloc.Snapshot | None = None
+        # latest diff: label and the lines with the largest growth
+        self.diffs: dict = {}
+
+    def after_etl(self, label: str) -> None:
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        with self.lock:
+            if self.snapshot is not None:
+                stats = snapshot.compare_to(self.snapshot, "lineno")[: self.top]
+                self.diffs = {
+                    "label": label,
+                    "traced": tracemalloc.get_traced_memory()[0],
+                    "top": [
+                        {
+                            "location": str(stat.traceback),
+                            "size_diff": stat.size_diff,
+                            "count_diff": stat.count_diff,
+                        }
+                        for stat in stats
+                    ],
+                }
+                logger.debug(f"memory after {label}: {self.diffs['top'][:3]}")
+            self.snapshot = snapshot
+
+
+# shared by all data processors of the process
+memory_tracker = shared(MemoryTracker(enabled=os.getenv("MEMORY_TRACE", "") == "1"))
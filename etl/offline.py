@@ -0,0 +1,158 @@
+import collections
+import hashlib
+import json
+import threading
+
+import httpx
+import numpy as np
+import pandas as pd
+import trio
+
+from etl.archive import ResponseArchive
+from etl.etl import DataProcessor, RequestParams
+
+# psr types of the synthetic ENTSO-E documents
+GENERATION_PSR_TYPES = ("B01", "B04", "B05", "B10", "B12", "B16", "B18", "B19")
+RENEWABLES_PSR_TYPES = ("B16", "B18", "B19")
+
+
+def _time_series(
+    start, end, n_points, resolution, values, psr_type=None, consumption=False
+):
+    domain = (
+        "outBiddingZone_Domain.mRID" if consumption else "inBiddingZone_Domain.mRID"
+    )
+    psr = f"<MktPSRType><psrType>{psr_type}</psrType></MktPSRType>" if psr_type else ""
+    points = "".join(
+        f"<Point><position>{i + 1}</position><quantity>{value:.0f}</quantity></Point>"
+        for i, value in enumerate(values[:n_points])
+    )
+    return (
+        "<TimeSeries><mRID>1</mRID><businessType>A01</businessType>"
+        f'<{domain} codingScheme="A01">10Y1001A1001A83F</{domain}>'
+        "<quantity_Measure_Unit.name>MAW</quantity_Measure_Unit.name>"
+        f"<curveType>A01</curveType>{psr}"
+        f"<Period><timeInterval><start>{start:%Y-%m-%dT%H:%MZ}</start>"
+        f"<end>{end:%Y-%m-%dT%H:%MZ}</end></timeInterval>"
+        f"<resolution>{resolution}</resolution>{points}</Period></TimeSeries>"
+    )
+
+
+def entsoe_document(params: dict, seed: int = 0) -> str:
+    """synthetic ENTSO-E generation/load document of the request parameters,
+    shaped like the real responses of the document types used by the etl
+    """
+    start = DataProcessor.parse_entsoe_date(params["periodStart"])
+    end = DataProcessor.parse_entsoe_date(params["periodEnd"])
+    rng = np.random.default_rng(seed)
+    n_points = max(int((end - start) / pd.Timedelta(minutes=15)), 1)
+    # daily profile between 0.2 and 1
+    profile = 0.6 - 0.4 * np.cos(2 * np.pi * np.arange(n_points) / 96)
+
+    document_type = params.get("documentType")
+    series = []
+    if document_type == "A68":  # installed capacity, one value per year
+        year = start.floor("D").replace(month=1, day=1)
+        for psr_type in GENERATION_PSR_TYPES:
+            series.append(
+                _time_series(
+                    year,
+                    year + pd.DateOffset(years=1),
+                    1,
+                    "P1Y",
+                    rng.uniform(5_000, 60_000, 1),
+                    psr_type,
+                )
+            )
+    elif document_type in ("A65", "A71"):  # total load and its forecast
+        values = 40_000 + 25_000 * profile + rng.normal(0, 500, n_points)
+        # the load is reported as consumption of the bidding zone
+        consumption = document_type == "A65"
+        series.append(
+            _time_series(start, end, n_points, "PT15M", values, None, consumption)
+        )
+    else:  # generation by type and the wind and solar forecast
+        psr_types = (
+            RENEWABLES_PSR_TYPES if document_type == "A69" else GENERATION_PSR_TYPES
+        )
+        for psr_type in psr_types:
+            values = (
+                rng.uniform(500, 10_000) * profile * rng.uniform(0.8, 1.2, n_points)
+            )
+            series.append(_time_series(start, end, n_points, "PT15M", values, psr_type))
+        if document_type == "A75":  # pumping
+            values = rng.uniform(0, 2_000, n_points)
+            series.append(
+                _time_series(start, end, n_points, "PT15M", values, "B10", True)
+            )
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><GL_MarketDocument '
+        'xmlns="urn:iec62325.351:tc57wg16:451-6:generationloaddocument:3:0">'
+        f"{''.join(series)}</GL_MarketDocument>"
+    )
+
+
+def energy_charts_document(params: dict, seed: int = 0) -> str:
+    """synthetic Energy-Charts daily renewable share of the current year"""
+    yesterday = pd.Timestamp.now(tz="UTC").floor("D") - pd.Timedelta(days=1)
+    days = pd.date_range(yesterday.replace(month=1, day=1), yesterday, freq="D")
+    rng = np.random.default_rng(seed)
+    return json.dumps(
+        {
+            "days": list(days.strftime("%d.%m.%Y")),
+            "data": list(rng.uniform(20, 80, len(days)).round(1)),
+            "deprecated": False,
+        }
+    )
+
+
+class OfflineAPI:
+    """stand-in for the ENTSO-E and Energy-Charts apis, answering every
+    request after `latency` seconds with the archived response of the same
+    request (if an archive is given) or a synthetic document. Counts the
+    requests per api host.
+
+    transport = httpx.MockTransport(OfflineAPI()), see DataProcessor.transport
+    """
+
+    def __init__(self, archive: ResponseArchive | None = None, latency: float = 0.0):
+        self.archive = archive
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests: collections.Counter = collections.Counter()
+        self.archived = (
+            {
+                ResponseArchive.request_digest(
+                    RequestParams(entry["key"], entry["url"], entry["params"])
+                ): entry
+                for entry in archive.entries()
+            }
+            if archive
+            else {}
+        )
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self)
+
+    def report(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.requests)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        with self.lock:
+            self.requests[request.url.host] += 1
+        await trio.sleep(self.latency)
+
+        params = dict(request.url.params)
+        url = str(request.url.copy_with(query=None))
+        digest = ResponseArchive.request_digest(RequestParams(None, url, params))
+        if entry := self.archived.get(digest):
+            return self.archive.load(entry)
+
+        seed = int(hashlib.sha256(str(request.url).encode()).hexdigest()[:8], 16)
+        if "entsoe" in request.url.host:
+            return httpx.Response(200, text=entsoe_document(params, seed))
+        if request.url.path.endswith("ren_share_daily_avg"):
+            return httpx.Response(200, text=energy_charts_document(params, seed))
+        return httpx.Response(404)
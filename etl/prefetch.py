@@ -0,0 +1,160 @@
+import collections
+import json
+import logging
+import pathlib
+import threading
+import time
+
+import trio
+
+from etl.cache import get_cache
+from etl.data import MAX_AGE
+from etl.files import atomic_write
+from etl.memory import shared
+
+logger = logging.getLogger("app_logger")
+
+cfd = pathlib.Path(__file__).parent
+
+# geographic neighbors of the bidding zones (country level)
+NEIGHBORS = {
+    "AL": ["ME", "XK", "MK", "GR"],
+    "AT": ["DE", "CZ", "SK", "HU", "SI", "IT", "CH"],
+    "BA": ["HR", "RS", "ME"],
+    "BE": ["FR", "NL", "DE", "LU"],
+    "BG": ["RO", "RS", "MK", "GR"],
+    "CH": ["DE", "FR", "IT", "AT"],
+    "CZ": ["DE", "PL", "SK", "AT"],
+    "DE": ["FR", "NL", "BE", "LU", "CH", "AT", "CZ", "PL", "DK"],
+    "DE_LU": ["FR", "NL", "BE", "CH", "AT", "CZ", "PL", "DK"],
+    "DK": ["DE", "SE", "NO", "NL"],
+    "EE": ["LV", "FI"],
+    "ES": ["PT", "FR"],
+    "FI": ["SE", "NO", "EE"],
+    "FR": ["BE", "DE", "CH", "IT", "ES", "GB"],
+    "GB": ["IE", "FR", "BE", "NL", "NO"],
+    "GR": ["AL", "MK", "BG", "IT"],
+    "HR": ["SI", "HU", "RS", "BA", "ME"],
+    "HU": ["AT", "SK", "RO", "RS", "HR", "SI", "UA"],
+    "IE": ["GB"],
+    "IT": ["FR", "CH", "AT", "SI", "GR", "ME"],
+    "LT": ["LV", "PL", "SE"],
+    "LU": ["BE", "DE", "FR"],
+    "LV": ["EE", "LT"],
+    "ME": ["HR", "BA", "RS", "AL", "IT"],
+    "MK": ["RS", "BG", "GR", "AL"],
+    "NL": ["DE", "BE", "GB", "NO", "DK"],
+    "NO": ["SE", "FI", "DK", "NL", "DE", "GB"],
+    "PL": ["DE", "CZ", "SK", "LT", "SE"],
+    "PT": ["ES"],
+    "RO": ["HU", "BG", "RS", "MD", "UA"],
+    "RS": ["HU", "RO", "BG", "MK", "ME", "BA", "HR"],
+    "SE": ["NO", "FI", "DK", "DE", "PL", "LT"],
+    "SI": ["IT", "AT", "HU", "HR"],
+    "SK": ["CZ", "PL", "HU", "AT", "UA"],
+}
+
+
+class Prefetcher:
+    """keeps the likely next countries warm in the cache: the countries
+    users most often switch to from the current one, the most viewed
+    countries and the geographic neighbors of the current selection.
+    Shared by all sessions of the process, the observed switches are
+    persisted so the ranking survives restarts. A country is prefetched at
+    most every `retry_after` seconds, as zones which never get some of the
+    datasets never become warm.
+    """
+
+    def __init__(
+        self,
+        path=cfd / "tmp" / "country_switches.json",
+        size: int = 4,
+        retry_after: float = min(MAX_AGE.values()),
+    ):
+        self.path = pathlib.Path(path)
+        self.size = size
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.running: set[str] = set()
+        # country: time.monotonic() of its latest prefetch
+        self.prefetched: dict[str, float] = {}
+        self.views: collections.Counter = collections.Counter()
+        self.switches: dict[str, collections.Counter] = collections.defaultdict(
+            collections.Counter
+        )
+        if self.path.exists():
+            state = json.loads(self.path.read_text())
+            self.views.update(state.get("views", {}))
+            for from_code, counts in state.get("switches", {}).items():
+                self.switches[from_code].update(counts)
+
+    def save(self) -> None:
+        state = {"views": self.views, "switches": self.switches}
+        atomic_write(self.path, json.dumps(state))
+
+    def record_switch(self, from_code: str, to_code: str) -> None:
+        from_code, to_code = from_code.upper(), to_code.upper()
+        with self.lock:
+            self.views[to_code] += 1
+            if from_code != to_code:
+                self.switches[from_code][to_code] += 1
+            self.save()
+
+    def candidates(self, current: str) -> list[str]:
+        """countries to keep warm, most likely next selection first"""
+        current = current.upper()
+        with self.lock:
+            ranked = (
+                [code for code, _ in self.switches[current].most_common()]
+                + [code for code, _ in self.views.most_common()]
+                + NEIGHBORS.get(current, [])
+            )
+        return list(dict.fromkeys(c for c in ranked if c != current))[: self.size]
+
+    def is_warm(self, country_code: str) -> bool:
+        """all datasets of the country are cached within their max age"""
+        cache = get_cache()
+        return all(
+            (freshness := cache.freshness(key_name, country_code)) is not None
+            and freshness.age() <= max_age
+            for key_name, max_age in MAX_AGE.items()
+        )
+
+    def prefetch(self, current: str) -> None:
+        """warm the candidates of the current selection in a background
+        thread, without blocking the session
+        """
+        cold = [code for code in self.candidates(current) if not self.is_warm(code)]
+        now = time.monotonic()
+        with self.lock:
+            codes = [
+                code
+                for code in cold
+                if code not in self.running
+                and now - self.prefetched.get(code, float("-inf")) >= self.retry_after
+            ]
+            self.running.update(codes)
+            self.prefetched.update(dict.fromkeys(codes, now))
+        if codes:
+            threading.Thread(
+                target=trio.run, args=(self._prefetch, codes), daemon=True
+            ).start()
+
+    async def _prefetch(self, codes: list[str]) -> None:
+        from etl.etl import DataProcessor
+
+        logger.debug(f"prefetching {codes}")
+        try:
+            async with trio.open_nursery() as nursery:
+                for code in codes:
+                    nursery.start_soon(DataProcessor(code).run_etl, name=code)
+        except Exception as e:
+            # a failed prefetch only means a slower first render
+            logger.info(f"prefetching {codes} failed: {e}")
+        finally:
+            with self.lock:
+                self.running.difference_update(codes)
+
+
+# shared by all sessions of the process
+prefetcher = shared(Prefetcher())
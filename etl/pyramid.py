@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# resolutions of the pyramid levels, finest first
+LEVELS = ("15min", "30min", "1h", "1D")
+
+
+class ResamplingPyramid:
+    """mean resampled levels (15min, 30min, 1h, 1D) of a time indexed
+    frame, levels finer than the native resolution of the frame are left
+    out and the level of a frame already on its grid is the frame itself.
+    Built once and updated incrementally: only the buckets from the first
+    new or changed row on are resampled again.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.base = df
+        step = df.index.to_series().diff().median() if len(df) > 1 else None
+        self.freqs = [
+            freq
+            for freq in LEVELS
+            if step is None or pd.Timedelta(freq) >= step or freq == "1D"
+        ]
+        self.native = next((f for f in self.freqs if self.on_grid(df, f)), None)
+        self.levels = {
+            freq: df.resample(freq).mean() for freq in self.freqs if freq != self.native
+        }
+
+    @staticmethod
+    def on_grid(df: pd.DataFrame, freq: str) -> bool:
+        """True if resampling the float frame to freq would return it as
+        is: every row starts its own bucket and no bucket is missing
+        """
+        if freq == "1D" or len(df) < 2 or not isinstance(df.index, pd.DatetimeIndex):
+            return False  # days are 23 or 25 hours long at dst changes
+        if not all(dtype.kind == "f" for dtype in df.dtypes):
+            return False
+        step = pd.Timedelta(freq).value
+        times = df.index.as_unit("ns").asi8
+        return bool((np.diff(times) == step).all() and times[0] % step == 0)
+
+    def level(self, freq: str) -> pd.DataFrame:
+        """the level of the resolution or, if the frame is coarser, the
+        finest level
+        """
+        if freq not in self.freqs:
+            freq = self.freqs[0]
+        return self.base if freq == self.native else self.levels[freq]
+
+    def nbytes(self) -> int:
+        """memory of the resampled levels in bytes, the base frame is the
+        data record itself and not counted
+        """
+        return sum(
+            int(level.memory_usage(deep=True).sum()) for level in self.levels.values()
+        )
+
+    @staticmethod
+    def first_change(old: pd.DataFrame, new: pd.DataFrame) -> int | None:
+        """position in new of the first row not in old, None if unchanged
+        and -1 if the frames can not be compared row by row
+        """
+        if not old.columns.equals(new.columns) or old.empty or new.empty:
+            return -1
+        if old.index[0] != new.index[0]:
+            return -1
+        n = min(len(old), len(new))
+        index_changed = old.index.asi8[:n] != new.index.asi8[:n]
+        a = old.to_numpy(dtype="f8", na_value=np.nan)[:n]
+        b = new.to_numpy(dtype="f8", na_value=np.nan)[:n]
+        changed = index_changed | ~((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=1)
+        if changed.any():
+            return int(changed.argmax())
+        return n if len(new) > n else (None if len(new) == len(old) else -1)
+
+    def update(self, df: pd.DataFrame) -> None:
+        position = self.first_change(self.base, df)
+        if position is None:
+            self.base = df
+            return
+        if position < 0 or (self.native and not self.on_grid(df, self.native)):
+            self.__init__(df)
+            return
+
+        t0 = df.index[position]
+        for freq in self.levels:
+            level = self.levels[freq]
+            # start of the bucket of t0
+            i = max(level.index.searchsorted(t0, side="right") - 1, 0)
+            start = level.index[i]
+            self.levels[freq] = pd.concat(
+                [level.iloc[:i], df.loc[start:].resample(freq).mean()]
+            )
+        self.base = df
+
+    def resolution_for(
+        self, start, end, width_px: int, pixels_per_point: int = 1
+    ) -> str:
+        """the finest resolution with at most one point per
+        `pixels_per_point` pixels of a chart showing [start, end)
+        """
+        points = width_px / pixels_per_point
+        for freq in self.freqs:
+            if (pd.Timestamp(end) - pd.Timestamp(start)) / pd.Timedelta(freq) <= points:
+                return freq
+        return self.freqs[-1]
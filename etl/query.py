@@ -0,0 +1,169 @@
+import argparse
+import logging
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl.cache import get_cache, history_key
+from etl.data import Data
+from etl.files import atomic_write
+
+try:
+    import duckdb
+except ImportError:  # optional, the query layer is not available without it
+    duckdb = None
+
+logger = logging.getLogger("app_logger")
+
+cfd = pathlib.Path(__file__).parent
+
+# seconds between two checks of the cache for new versions
+CHECK_EVERY = 5
+
+
+def to_long_format(df: pd.DataFrame, country_code: str) -> pd.DataFrame:
+    """one row per (time, series, kind) with a non-missing value, where
+    series is the first and kind the second column level (if any)
+    """
+    columns = [
+        column if isinstance(column, tuple) else (column, "") for column in df.columns
+    ]
+    values = df.to_numpy(dtype="f8", na_value=np.nan)
+    n_rows, n_columns = values.shape
+    long = pd.DataFrame(
+        {
+            "time": np.repeat(df.index.tz_convert("UTC"), n_columns),
+            "country": country_code.upper(),
+            "series": np.tile([str(column[0]) for column in columns], n_rows),
+            "kind": np.tile([str(column[1]) for column in columns], n_rows),
+            "value": values.ravel(),
+        }
+    )
+    return long.dropna(subset=["value"])
+
+
+class QueryEngine:
+    """embedded analytical sql (duckdb) over the cached datasets.
+
+    Every cached dataset is exported to a long format parquet file
+    (time, country, series, kind, value) whenever the cache holds a newer
+    version, and each data key is a view over the files of all countries,
+    e.g. SELECT * FROM CURRENT_GENERATION_ENTSOE WHERE country = 'DE'.
+    The backfilled history of a key is the view HISTORY_<key>.
+    """
+
+    def __init__(
+        self, cache=None, path=cfd / "tmp" / "parquet", check_every=CHECK_EVERY
+    ):
+        if duckdb is None:
+            raise ImportError("the query layer requires duckdb: pip install duckdb")
+        self.cache = cache or get_cache()
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.connection = duckdb.connect()
+        self.check_every = check_every
+        # fetch times of the cache entries at the last sync, time of the check
+        self.signature: tuple | None = None
+        self.checked = float("-inf")
+        # (key, country): fetch time of the exported dataset; created views
+        self.exported: dict[tuple[str, str], float | None] = {}
+        self.views: set[str] = set()
+
+    def file_path(self, key_name: str, country_code: str) -> pathlib.Path:
+        return self.path / f"{key_name}_{country_code.upper()}.parquet"
+
+    def sync(self, force: bool = False) -> None:
+        """export new cache versions to parquet and (re)create the views;
+        nothing to do if no cache entry changed since the last sync (checked
+        at most every `check_every` seconds unless forced)
+        """
+        if not force and time.monotonic() - self.checked < self.check_every:
+            return
+        self.checked = time.monotonic()
+        entries = self.cache.entries()
+        signature = tuple(
+            (key_name, country_code, self.cache.fetched_at(key_name, country_code))
+            for key_name, country_code in entries
+        )
+        if signature == self.signature:
+            return
+
+        for key_name, country_code, fetched_at in signature:
+            file_path = self.file_path(key_name, country_code)
+            if file_path.exists() and file_path.stat().st_mtime >= (fetched_at or 0):
+                continue
+            df = self.cache.read(key_name, country_code)
+            if df is None or df.empty:
+                continue
+            # the files are shared by the engines of all sessions: replaced
+            # atomically, never seen half written
+            atomic_write(
+                file_path, to_long_format(df, country_code).to_parquet(index=False)
+            )
+            logger.debug(f"exported {key_name} ({country_code}) to parquet")
+
+        for key in Data.name_keys():
+            for name in (key.name, history_key(key.name)):
+                files = sorted(self.path.glob(f"{name}_*.parquet"))
+                if not files:
+                    continue
+                self.connection.execute(
+                    f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM "
+                    f"read_parquet({[str(file) for file in files]})"
+                )
+                self.views.add(name)
+        self.exported = {
+            (key_name, country_code): fetched_at
+            for key_name, country_code, fetched_at in signature
+        }
+        self.signature = signature
+
+    def is_current(self, key_name: str, country_code: str) -> bool:
+        """the view of the key exists and holds the cached version of the
+        dataset of the country
+        """
+        return key_name in self.views and self.exported.get(
+            (key_name, country_code.upper())
+        ) == self.cache.fetched_at(key_name, country_code)
+
+    def sql(self, query: str, parameters=None) -> pd.DataFrame:
+        self.sync()
+        return self.connection.execute(query, parameters or []).df()
+
+    def mean_by_source(self, country_code: str, start, end) -> pd.Series:
+        """mean generation [MW] per source in [start, end), aggregated by
+        duckdb instead of materializing the frame in pandas; empty if
+        nothing was cached yet
+        """
+        # the country's dataset may have been cached within check_every
+        if not self.is_current("CURRENT_GENERATION_ENTSOE", country_code):
+            self.sync(force=True)
+        if "CURRENT_GENERATION_ENTSOE" not in self.views:
+            return pd.Series(dtype="f8", name="mean")
+        df = self.sql(
+            "SELECT series, avg(value) AS mean FROM CURRENT_GENERATION_ENTSOE "
+            "WHERE country = ? AND time >= ? AND time < ? "
+            "AND kind IN ('Actual Aggregated', '') GROUP BY series",
+            [
+                country_code.upper(),
+                pd.Timestamp(start).tz_convert("UTC").to_pydatetime(),
+                pd.Timestamp(end).tz_convert("UTC").to_pydatetime(),
+            ],
+        )
+        return df.set_index("series")["mean"].rename_axis(None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="run sql on the cached data, one view per data key "
+        "with the columns time, country, series, kind, value"
+    )
+    parser.add_argument(
+        "query", help="e.g. SELECT count(*) FROM CURRENT_GENERATION_ENTSOE"
+    )
+    args = parser.parse_args()
+
+    with pd.option_context("display.max_rows", 100, "display.width", 200):
+        print(QueryEngine().sql(args.query))
@@ -0,0 +1,111 @@
+import contextlib
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import trio
+
+logger = logging.getLogger("app_logger")
+
+# ENTSO-E allows 400 requests per minute and security token
+ENTSOE_RATE = 400 / 60
+ENTSOE_BURST = 40
+
+
+class TokenBucket:
+    """token bucket shared by all trio tasks of the process; each streamlit
+    session runs its own trio loop in its own thread, therefore the state is
+    guarded by a threading lock and callers sleep with trio until their
+    token is available
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """take a token, returns the seconds to wait until it is valid"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate, 0.0)
+
+    async def acquire(self) -> None:
+        if (wait := self.reserve()) > 0:
+            logger.debug(f"rate limit reached, waiting {wait:.2f}s")
+        await trio.sleep(wait)
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """token bucket coordinated across processes through a table in a local
+    sqlite file, the bucket row is updated in an immediate transaction
+    """
+
+    def __init__(self, rate: float, capacity: float, path, name: str):
+        super().__init__(rate, capacity)
+        self.path = str(path)
+        self.name = name
+        with contextlib.closing(self.connect()) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(name TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)",
+                (name, capacity, time.time()),
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def reserve(self) -> float:
+        # closing without commit rolls back
+        with self.lock, contextlib.closing(self.connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            tokens, updated = connection.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            # wall clock, monotonic clocks are not shared between processes
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(now - updated, 0) * self.rate)
+            tokens -= 1
+            connection.execute(
+                "UPDATE buckets SET tokens = ?, updated = ? WHERE name = ?",
+                (tokens, now, self.name),
+            )
+            connection.execute("COMMIT")
+        return max(-tokens / self.rate, 0.0)
+
+
+_buckets: dict[tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_limiter(host: str, token: str = "") -> TokenBucket | None:
+    """the shared limiter of an api host and security token, None for hosts
+    without quota. With RATE_LIMIT_DB set, the bucket is shared with all
+    processes using the same sqlite file.
+    """
+    if "entsoe" not in host:
+        return None
+
+    key = (host, hashlib.sha256(token.encode()).hexdigest()[:16])
+    with _buckets_lock:
+        if key not in _buckets:
+            if path := os.getenv("RATE_LIMIT_DB", ""):
+                _buckets[key] = SQLiteTokenBucket(
+                    ENTSOE_RATE, ENTSOE_BURST, path, name="|".join(key)
+                )
+            else:
+                _buckets[key] = TokenBucket(ENTSOE_RATE, ENTSOE_BURST)
+        return _buckets[key]
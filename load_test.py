@@ -0,0 +1,193 @@
+"""load test of the dashboard: N concurrent headless sessions (streamlit
+AppTest, one thread per session as in the streamlit server) open the app
+and switch countries, the apis are replaced by an offline stand-in.
+Every N runs in its own process with an empty cache.
+
+python load_test.py --sessions 1 4 16 --switches 3 --latency 0.2
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+cfd = pathlib.Path(__file__).parent
+
+COUNTRIES = ["DE", "FR", "PL", "NL", "AT", "ES", "IT", "CZ"]
+
+
+def run_sessions(
+    n_sessions: int,
+    switches: int,
+    countries: list[str],
+    latency: float,
+    archive_path: str | None,
+    tmp_path: pathlib.Path,
+) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    import etl.prefetch
+    from etl.archive import ResponseArchive
+    from etl.coalesce import coalescer
+    from etl.etl import DataProcessor
+    from etl.offline import OfflineAPI
+
+    api = OfflineAPI(ResponseArchive(archive_path) if archive_path else None, latency)
+    DataProcessor.transport = api.transport()
+    # switches of the simulated sessions must not train the real prefetcher
+    etl.prefetch.prefetcher = etl.prefetch.Prefetcher(
+        tmp_path / "country_switches.json"
+    )
+
+    first_render_latencies: list[float] = []
+    latencies: list[float] = []
+    errors: list[str] = []
+    lock = threading.Lock()
+
+    def timed_run(app: AppTest) -> None:
+        """time to the first render and until the etl (in the background,
+        see DataProcessor.start_etl) completed and its data was rendered
+        """
+        start = time.perf_counter()
+        app.run()
+        first_render = time.perf_counter() - start
+        processor = app.session_state.data_processor
+        while processor.etl_running:
+            time.sleep(0.05)
+        app.run()
+        elapsed = time.perf_counter() - start
+        with lock:
+            first_render_latencies.append(first_render)
+            latencies.append(elapsed)
+            errors.extend(exception.message for exception in app.exception)
+
+    def session(i: int) -> None:
+        rng = random.Random(i)
+        app = AppTest.from_file(str(cfd / "streamlit_app.py"), default_timeout=300)
+        timed_run(app)
+        for _ in range(switches):
+            app.selectbox(key="select_box").set_value(rng.choice(countries))
+            timed_run(app)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(n_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu = (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "sessions": n_sessions,
+        "runs": len(latencies),
+        "first_p50_s": round(float(np.percentile(first_render_latencies, 50)), 3),
+        "p50_s": round(p50, 3),
+        "p95_s": round(p95, 3),
+        "p99_s": round(p99, 3),
+        "wall_s": round(wall, 2),
+        "cpu_percent": round(100 * cpu / wall, 1),
+        # linux reports kilobytes
+        "max_rss_mb": round(end_usage.ru_maxrss / 1024, 1),
+        "outbound": sum(api.report().values()),
+        "coalesced": coalescer.report().get("duplicates", 0),
+        "errors": len(errors),
+        "error_messages": sorted(set(errors)),
+    }
+
+
+def print_table(results: list[dict]) -> None:
+    columns = list(results[0].keys())
+    widths = [
+        max(len(column), *(len(str(r[column])) for r in results)) for column in columns
+    ]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print(
+            "  ".join(
+                str(result[column]).rjust(width)
+                for column, width in zip(columns, widths)
+            )
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load test of the dashboard")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--switches", type=int, default=3)
+    parser.add_argument("--countries", nargs="+", default=COUNTRIES)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="api response time [s]"
+    )
+    parser.add_argument(
+        "--archive", default=None, help="replay the responses of this archive"
+    )
+    parser.add_argument("--verbose", action="store_true", help="show the app logs")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        result = run_sessions(
+            args.worker,
+            args.switches,
+            args.countries,
+            args.latency,
+            args.archive,
+            pathlib.Path(os.environ["CACHE_DB"]).parent,
+        )
+        print(json.dumps(result))
+        sys.exit()
+
+    results = []
+    for n_sessions in args.sessions:
+        with tempfile.TemporaryDirectory() as tmp:
+            worker = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--worker",
+                    str(n_sessions),
+                    "--switches",
+                    str(args.switches),
+                    "--latency",
+                    str(args.latency),
+                    "--countries",
+                    *args.countries,
+                    *(["--archive", args.archive] if args.archive else []),
+                ],
+                cwd=cfd,
+                env={
+                    **os.environ,
+                    "CACHE_BACKEND": "sqlite",
+                    "CACHE_DB": str(pathlib.Path(tmp) / "cache.db"),
+                    # synthetic forecasts must not be scored by the dashboard
+                    "FORECAST_ACCURACY_PATH": str(
+                        pathlib.Path(tmp) / "forecast_accuracy.json"
+                    ),
+                },
+                stdout=subprocess.PIPE,
+                stderr=None if args.verbose else subprocess.DEVNULL,
+                text=True,
+                check=True,
+            )
+        results.append(json.loads(worker.stdout.strip().splitlines()[-1]))
+        print(f"{n_sessions} sessions done", flush=True)
+
+    error_messages = sorted(
+        {message for result in results for message in result.pop("error_messages")}
+    )
+    print_table(results)
+    for message in error_messages:
+        print(f"error: {message}")
@@ -6,6 +6,7 @@ from entsoe import Area as entsoe_areas
 # from entsoe.mappings import lookup_area
 
 import trio
+import pandas as pd
 import pathlib
 import logging
 
@@ -17,7 +18,10 @@ from charts.create_figures import (
     create_metrics,
     create_pie_chart,
 )
+from charts.serialization import compact_figure, use_fast_json_engine
 from etl.etl import DataProcessor
+from etl.memory import memory_report, session_report
+from etl.prefetch import prefetcher
 
 # from charts.create_figures import visualize
 
@@ -29,7 +33,36 @@ API_URL = ""
 APP_TITLE = "Energy Dashboard"
 cfd = pathlib.Path(__file__).parent
 COUNTRY_CODES = entsoe_areas.__members__.keys()
-
+# seconds between the checks for stale data once the etl completed
+REVALIDATE_EVERY = 60
+# approximate plot width [px] of the generation by source chart
+BAR_CHART_WIDTH = 700
+
+
+# data keys each chart slot in st.session_state.charts is computed from
+CHART_DEPENDENCIES = {
+    "daily_capacity_factor_by_source": {
+        "CURRENT_GENERATION_ENTSOE",
+        "CAPACITY_BY_SOURCE_ENTSOE",
+    },
+    "current_generation_by_source": {
+        "CURRENT_GENERATION_ENTSOE",
+        "TOTAL_FORECAST_ENTSOE",
+        "RENEWABLES_FORECAST_ENTSOE",
+        "ACTUAL_TOTAL_LOAD_ENTSOE",
+    },
+    "total_generation": {
+        "CURRENT_GENERATION_ENTSOE",
+        "CAPACITY_BY_SOURCE_ENTSOE",
+    },
+    "renewables_generation": {
+        "CURRENT_GENERATION_ENTSOE",
+        "CAPACITY_BY_SOURCE_ENTSOE",
+        "RENEWABLE_SHARE_ENERGY_CHARTS",
+    },
+    "current_electricity_mix": {"CURRENT_GENERATION_ENTSOE"},
+    "location": set(),  # depends on the country only
+}
 
 container_style = """
 {
@@ -41,6 +74,7 @@ margin: 0px 0px;
 
 
 def set_page_settings():
+    use_fast_json_engine()
     with open(cfd / "static" / "style.css") as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
@@ -50,6 +84,8 @@ def initialize_session_state():
         st.session_state.container_counter = 0
     if "country_code" not in st.session_state:
         st.session_state.country_code = "DE"  # default value
+        # new session: warm the countries it most likely selects next
+        prefetcher.prefetch(st.session_state.country_code)
     if "charts" not in st.session_state:
         st.session_state.charts = {}
     if "warning" not in st.session_state:
@@ -58,8 +94,9 @@ def initialize_session_state():
         st.session_state.grid_created = False
     if "run_every" not in st.session_state:
         st.session_state.run_every = 1
-    if "warning_text" not in st.session_state:
-        st.session_state.warning_text = []
+    if "warning_version" not in st.session_state:
+        # version of the event log shown in the warning banner
+        st.session_state.warning_version = None
 
 
 class DashBoard:
@@ -68,6 +105,11 @@ class DashBoard:
     def __init__(self, data_processor):
         """put the streamlit app together"""
         self.data_processor = data_processor
+        # data versions of the last render, None before the first render
+        self.rendered_versions: dict[str, int] | None = None
+        # etl completion at the last render and the charts drawn so far
+        self.rendered_completed = False
+        self.rendered_charts: set[str] = set()
         self.display_header()
         self.main_page()
 
@@ -122,19 +164,24 @@ class DashBoard:
                     )
 
     def set_country_code(self):
+        previous_country_code = st.session_state.country_code
         st.session_state.country_code = st.session_state.select_box.lower()
+        prefetcher.record_switch(previous_country_code, st.session_state.country_code)
+        prefetcher.prefetch(st.session_state.country_code)
         app_logger.debug(
             f"st.session_state.country_code now: {st.session_state.country_code}"
         )
-        data_processor.set_country_code(st.session_state.country_code)
-        #        st.session_state.data_processor.data.clear(st.session_state.country_code)
-        st.session_state.warning_text.clear()
+        # the run of the previous country would delay the new one
+        self.data_processor.cancel_etl()
+        self.data_processor.set_country_code(st.session_state.country_code)
+        st.session_state.warning_version = None
         st.session_state.grid_created = False
         st.session_state.run_every = 1
 
     def main_page(self):
         if not st.session_state.grid_created:
             st.session_state.warning = st.empty()
+            st.session_state.data_as_of = st.empty()
 
             # generate chart grid and store in session_state (only once)
             top_left, top_right = st.columns(2)
@@ -160,34 +207,115 @@ class DashBoard:
 
         self.render()
 
-    @st.fragment(run_every=st.session_state.get("run_every", "1s"))
-    def render(self):
-        if self.data_processor.completed and st.session_state.run_every is not None:
-            st.session_state.run_every = None
+    def schedule_etl(self):
+        """start the etl in the background when the country has not been
+        fetched yet or has stale keys; ticks every second while it runs
+        """
+        processor = self.data_processor
+        if processor.etl_running:
+            return
+        # stale-while-revalidate: keep showing the data while the stale keys
+        # are refetched
+        if not processor.completed or processor.data.stale_keys():
+            processor.start_etl(instruments=[AsyncTracer()])
+            if st.session_state.run_every != 1:
+                st.session_state.run_every = 1
+                st.rerun()
+        elif st.session_state.run_every == 1:
+            st.session_state.run_every = REVALIDATE_EVERY
             st.rerun()
 
-        data = self.data_processor.data
-        st.session_state.warning_text = self.data_processor.data.warning
-        if text := st.session_state.warning_text:
-            with st.session_state.warning:
-                st.warning("; ".join(text))
-
+    @st.fragment(run_every=st.session_state.get("run_every", "1s"))
+    def render(self):
+        self.schedule_etl()
+        processor = self.data_processor
+
+        # only re-render when the etl committed new data, completed or
+        # reported new events since the last tick
+        versions = processor.versions_snapshot()
+        completed = processor.completed
+        if (
+            self.rendered_versions == versions
+            and self.rendered_completed == completed
+            and processor.data.events.version == st.session_state.warning_version
+        ):
+            return
+        changed_keys = processor.changed_keys(self.rendered_versions, versions)
+        self.rendered_versions = versions
+        self.rendered_completed = completed
+
+        # the etl thread commits while the charts are computed
+        with processor.lock:
+            data = processor.data
+            with st.session_state.data_as_of:
+                st.caption(self.data_as_of(data))
+
+            # progressive rendering: a chart is drawn as soon as all its
+            # input data arrived (with the data at hand once the etl
+            # completed or passed its deadline) and redrawn when it changes
+            for chart_name, data_keys in CHART_DEPENDENCIES.items():
+                if chart_name in self.rendered_charts and not data_keys & changed_keys:
+                    continue
+                if completed or data_keys <= set(data.keys()):
+                    getattr(self, f"render_{chart_name}")(data)
+                    self.rendered_charts.add(chart_name)
+
+        # after the charts, which may report incomplete data
+        if data.events.version != st.session_state.warning_version:
+            st.session_state.warning_version = data.events.version
+            if events := data.events.active():
+                st.session_state.warning.warning(
+                    "; ".join(event.message for event in events)
+                )
+            else:
+                st.session_state.warning.empty()
+
+    @staticmethod
+    def data_as_of(data) -> str:
+        """fetch time of the oldest dataset and end of the generation data"""
+        if not data.freshness:
+            return "no data yet"
+        tz = data.country.tz
+        fetched_at = pd.Timestamp(
+            min(freshness.fetched_at for freshness in data.freshness.values()),
+            unit="s",
+            tz="UTC",
+        ).tz_convert(tz)
+        text = f"data as of {fetched_at:%d.%m.%Y %H:%M}"
+        generation = data.freshness.get("CURRENT_GENERATION_ENTSOE")
+        if generation is not None and generation.data_end is not None:
+            text += f", generation until {generation.data_end.tz_convert(tz):%H:%M}"
+        if data.stale_keys():
+            text += " (updating...)"
+        return text
+
+    def render_daily_capacity_factor_by_source(self, data):
         with st.session_state.charts["daily_capacity_factor_by_source"]:
             (
                 annotation,
                 capacity_factor_by_source,
             ) = data.daily_capacity_factor_by_source()
             fig = create_horizontal_bar_chart(annotation, capacity_factor_by_source)
-            st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+            st.plotly_chart(
+                compact_figure(fig), theme="streamlit", use_container_width=True
+            )
 
+    def render_current_generation_by_source(self, data):
         with st.session_state.charts["current_generation_by_source"]:
+            # visible window of the bar chart, see create_bar_chart
+            now = pd.Timestamp.now(tz=data.country.tz)
+            start = now.floor("D") - pd.Timedelta(hours=12 if now.hour > 12 else 24)
+            end = now.floor("D") + pd.Timedelta(days=2)  # end of the forecasts
             fig = create_bar_chart(
-                data.current_gen_by_source(),
+                data.current_gen_by_source(start, end, BAR_CHART_WIDTH),
                 tz=data.country.tz,
                 df_load=data.total_load_distribution(),
             )
-            st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+            st.plotly_chart(
+                compact_figure(fig), theme="streamlit", use_container_width=True
+            )
 
+    def render_total_generation(self, data):
         with st.session_state.charts["total_generation"].container():
             (
                 total_aggregated_yesterday,
@@ -202,22 +330,29 @@ class DashBoard:
                 total_max_installed,
                 sub_text,
             )
-            st.plotly_chart(fig, theme="streamlit", use_container_width=False)
+            st.plotly_chart(
+                compact_figure(fig), theme="streamlit", use_container_width=False
+            )
             fig_top = create_metrics(
                 "label",
                 total_aggregated_yesterday,
                 tz=data.country.tz,
                 suffix="TWh",
             )
-            st.plotly_chart(fig_top, theme="streamlit", use_container_width=False)
+            st.plotly_chart(
+                compact_figure(fig_top), theme="streamlit", use_container_width=False
+            )
 
+    def render_renewables_generation(self, data):
         with st.session_state.charts["renewables_generation"].container():
             sub_text = "Yesterday"
             renewable_share_yesterday = round(data.renewable_share_yesterday2())
             fig = create_gauge(
                 renewable_share_yesterday, "%", "Renewable Share", 100, sub_text
             )
-            st.plotly_chart(fig, theme="streamlit", use_container_width=False)
+            st.plotly_chart(
+                compact_figure(fig), theme="streamlit", use_container_width=False
+            )
             fig_metrics = create_metrics(
                 "",
                 renewable_share_yesterday,
@@ -225,27 +360,67 @@ class DashBoard:
                 data_df=data.renewable_share(),
                 suffix="%",
             )
-            st.plotly_chart(fig_metrics, theme="streamlit", use_container_width=False)
+            st.plotly_chart(
+                compact_figure(fig_metrics),
+                theme="streamlit",
+                use_container_width=False,
+            )
 
+    def render_current_electricity_mix(self, data):
         with st.session_state.charts["current_electricity_mix"]:
             fig = create_pie_chart(
                 *data.current_power_mix(),
             )
-            st.plotly_chart(fig, theme="streamlit", use_container_width=True)
+            st.plotly_chart(
+                compact_figure(fig), theme="streamlit", use_container_width=True
+            )
 
+    def render_location(self, data):
         with st.session_state.charts["location"]:
             fig = create_map(
                 data.country.code,
                 data.country.name,
             )
-            st.plotly_chart(fig, theme="streamlit", use_container_width=True)
-
-    async def run(self):
-        """run the etl process and continuously update the dashboard"""
-        if not data_processor.completed:
-            async with trio.open_nursery() as nursery:
-                nursery.start_soon(self.data_processor.run_etl)
+            st.plotly_chart(
+                compact_figure(fig), theme="streamlit", use_container_width=True
+            )
 
+    def memory_view(self):
+        """admin view (?admin=1): memory of the datasets of all sessions,
+        of this session's state and the tracemalloc diff of the last etl run
+        """
+        report = memory_report()
+        with st.expander("memory"):
+            st.write(
+                f"rss: {(report['rss'] or 0) / 2**20:.1f} MiB, "
+                f"data of {len(report['processors'])} data processors: "
+                f"{report['total'] / 2**20:.1f} MiB"
+            )
+            st.dataframe(
+                pd.DataFrame(
+                    [
+                        {
+                            "processor": i,
+                            "country": country["country"],
+                            "key": key_name,
+                            "bytes": size,
+                        }
+                        for i, processor in enumerate(report["processors"])
+                        for country in processor["countries"]
+                        for key_name, size in {
+                            **country["keys"],
+                            "warnings": country["warnings"],
+                            "pyramids": country["pyramids"],
+                            "energy indices": country["energy_indices"],
+                        }.items()
+                    ]
+                )
+            )
+            st.write("this session's state [bytes]")
+            st.dataframe(pd.Series(session_report(st.session_state), name="bytes"))
+            if report["tracemalloc"]:
+                st.write(f"allocation growth since {report['tracemalloc']['label']}")
+                st.dataframe(pd.DataFrame(report["tracemalloc"]["top"]))
 
 class AsyncTracer(trio.abc.Instrument):
     def task_exited(self, task):
@@ -263,7 +438,12 @@ if __name__ == "__main__":
     set_page_settings()
     initialize_session_state()
 
-    data_processor = DataProcessor(st.session_state.get("country_code", "DE"))
+    # kept across reruns: holds the data of the recently selected countries
+    if "data_processor" not in st.session_state:
+        st.session_state.data_processor = DataProcessor(
+            st.session_state.get("country_code", "DE")
+        )
+    data_processor = st.session_state.data_processor
     dashboard = DashBoard(data_processor)
-
-    trio.run(dashboard.run, instruments=[AsyncTracer()])
+    if st.query_params.get("admin") == "1":
+        dashboard.memory_view()
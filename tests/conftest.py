@@ -0,0 +1,21 @@
+import pytest
+
+import etl.etl
+from etl.cache import CacheWriter, PickleCache
+from etl.coalesce import RequestCoalescer
+from etl.forecast_accuracy import ForecastAccuracy
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """data processors created in the test use a cache, a request
+    coalescer and a forecast accuracy tracker of their own (in tmp_path)
+    """
+    cache = PickleCache(tmp_path / "cache")
+    monkeypatch.setattr(etl.etl, "get_cache", lambda: cache)
+    monkeypatch.setattr(etl.etl, "get_cache_writer", lambda: CacheWriter(cache))
+    monkeypatch.setattr(etl.etl, "coalescer", RequestCoalescer())
+    monkeypatch.setattr(
+        etl.etl, "forecast_accuracy", ForecastAccuracy(tmp_path / "accuracy.json")
+    )
+    return cache
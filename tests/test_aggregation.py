@@ -0,0 +1,75 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from entsoe import Area
+
+from etl.aggregation import COUNTRY_CODES, EuropeanAggregate
+from etl.api import EUROPE, MetricStore
+from etl.cache import PickleCache
+
+KEY = "CURRENT_GENERATION_ENTSOE"
+
+
+def generation(solar: float, wind: float, periods: int = 8) -> pd.DataFrame:
+    index = pd.date_range("2024-06-01", periods=periods, freq="15min", tz="UTC")
+    return pd.DataFrame(
+        {"Solar": np.full(periods, solar), "Wind Onshore": np.full(periods, wind)},
+        index=index,
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PickleCache(tmp_path)
+    cache.write(KEY, "DE", generation(100.0, 50.0))
+    cache.write(KEY, "FR", generation(10.0, 5.0))
+    # zones overlapping the countries above
+    cache.write(KEY, "DE_LU", generation(101.0, 51.0))
+    cache.write(KEY, "DE_AT_LU", generation(120.0, 60.0))
+    cache.write(KEY, "DE_50HZ", generation(30.0, 20.0))
+    return cache
+
+
+def test_default_countries_do_not_overlap(cache):
+    aggregate = EuropeanAggregate.from_instant_data(cache=cache)
+
+    assert list(aggregate.countries) == ["DE", "FR"]
+    totals = aggregate.totals_by_source()
+    assert totals["Solar"].tolist() == [110.0, 110.0]
+    assert totals["Wind Onshore"].tolist() == [55.0, 55.0]
+
+
+def test_country_codes_are_entsoe_areas_without_sub_zones():
+    assert set(COUNTRY_CODES) <= set(Area.__members__)
+    assert not {"DE_LU", "DE_AT_LU", "CWE", "IE_SEM", "UK", "IT_NORD"} & set(
+        COUNTRY_CODES
+    )
+
+
+def test_given_zones_are_aggregated(cache):
+    aggregate = EuropeanAggregate.from_instant_data(["de_50hz", "fr"], cache=cache)
+
+    assert list(aggregate.countries) == ["DE_50HZ", "FR"]
+    assert aggregate.total().tolist() == [65.0, 65.0]
+
+
+def test_power_mix_of_the_latest_hour_reported_by_all(cache):
+    cache.write(KEY, "FR", generation(10.0, 5.0, periods=4))
+    mix, time_step = EuropeanAggregate.from_instant_data(cache=cache).power_mix()
+
+    assert time_step == pd.Timestamp("2024-06-01 00:00", tz="UTC")
+    assert mix.to_dict() == {"Solar": 110.0, "Wind Onshore": 55.0}
+
+
+def test_api_serves_the_european_power_mix(cache):
+    store = MetricStore(cache, check_every=0)
+    response = store.get(EUROPE, "power-mix", "application/json")
+
+    body = json.loads(response.body)
+    assert body["countries"] == ["DE", "FR"]
+    assert {row["source"]: row["power_mw"] for row in body["data"]} == {
+        "Solar": 110.0,
+        "Wind Onshore": 55.0,
+    }
@@ -0,0 +1,85 @@
+import http.client
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.api import ARROW_MEDIA_TYPE, MetricStore, serve
+from etl.cache import PickleCache
+
+KEY = "CURRENT_GENERATION_ENTSOE"
+
+
+@pytest.fixture
+def api(tmp_path):
+    """metrics api on a free port, of a cache with the generation of DE"""
+    cache = PickleCache(tmp_path)
+    index = pd.date_range("2024-06-01", periods=8, freq="15min", tz="UTC")
+    cache.write(KEY, "DE", pd.DataFrame({"Solar": np.full(8, 100.0)}, index=index))
+    store = MetricStore(cache)
+    server = serve(port=0, store=store)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, store
+    server.shutdown()
+
+
+def get(server, path: str, **headers) -> http.client.HTTPResponse:
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.request("GET", path, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    return response
+
+
+def test_responses_vary_by_accept(api):
+    server, _ = api
+    response = get(server, "/v1/europe/power-mix")
+
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "application/json"
+    assert response.getheader("Vary") == "Accept"
+
+    revalidated = get(
+        server, "/v1/europe/power-mix", **{"If-None-Match": response.getheader("ETag")}
+    )
+    assert revalidated.status == 304
+    assert revalidated.getheader("Vary") == "Accept"
+
+
+def test_arrow_and_json_have_their_own_etags(api):
+    pytest.importorskip("pyarrow")
+    server, _ = api
+    as_json = get(server, "/v1/europe/power-mix")
+    as_arrow = get(server, "/v1/europe/power-mix", Accept=ARROW_MEDIA_TYPE)
+
+    assert as_arrow.status == 200
+    assert as_arrow.getheader("Content-Type") == ARROW_MEDIA_TYPE
+    assert as_arrow.getheader("ETag") != as_json.getheader("ETag")
+
+
+def test_unknown_countries_are_not_kept(api):
+    server, store = api
+    for i in range(10):
+        assert get(server, f"/v1/xx{i}/kpis").status == 404
+    assert get(server, "/v1/unknown/metric").status == 404
+
+    assert store.countries == {}
+
+
+def test_countries_without_data_are_not_found(api):
+    server, store = api
+    response = get(server, "/v1/fr/kpis")
+
+    assert response.status == 404
+    assert list(store.countries) == ["FR"]
+
+
+def test_countries_lists_the_cached_countries(api):
+    server, _ = api
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.request("GET", "/v1/countries")
+
+    assert json.loads(connection.getresponse().read()) == {"countries": ["DE"]}
@@ -0,0 +1,45 @@
+import httpx
+import pandas as pd
+import trio
+
+import etl.etl
+from etl.backfill import Checkpoint, backfill
+from etl.cache import history_key
+from etl.coalesce import RequestCoalescer
+from etl.etl import DataProcessor
+from etl.offline import OfflineAPI
+
+KEY = "CURRENT_GENERATION_ENTSOE"
+START = pd.Timestamp("2024-01-01", tz="UTC")
+END = pd.Timestamp("2024-01-15", tz="UTC")
+
+
+def run_backfill(checkpoint_path):
+    trio.run(
+        backfill, ["DE"], [KEY], START, END, pd.Timedelta(days=7), 2, checkpoint_path
+    )
+
+
+def test_failed_windows_are_fetched_again(cache, monkeypatch, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint.json"
+    monkeypatch.setattr(
+        DataProcessor,
+        "transport",
+        httpx.MockTransport(lambda request: httpx.Response(503)),
+    )
+
+    run_backfill(checkpoint_path)
+
+    assert Checkpoint(checkpoint_path).completed == set()
+    assert cache.read(history_key(KEY), "DE") is None
+
+    # the api is back
+    monkeypatch.setattr(DataProcessor, "transport", OfflineAPI().transport())
+    monkeypatch.setattr(etl.etl, "coalescer", RequestCoalescer())
+
+    run_backfill(checkpoint_path)
+
+    assert len(Checkpoint(checkpoint_path).completed) == 2
+    history = cache.read(history_key(KEY), "DE")
+    assert history.index.min() == START
+    assert cache.read(KEY, "DE") is None
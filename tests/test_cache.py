@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.cache import CacheWriter, PickleCache, SQLiteCache, history_key
+
+KEY = "CURRENT_GENERATION_ENTSOE"
+ROWS = 2_000
+
+
+def dataset(version: int) -> pd.DataFrame:
+    index = pd.date_range("2024-01-01", periods=ROWS, freq="15min", tz="UTC")
+    return pd.DataFrame({"version": np.full(ROWS, version)}, index=index)
+
+
+@pytest.fixture(params=["pickle", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteCache(tmp_path / "cache.db")
+    return PickleCache(tmp_path)
+
+
+def test_readers_see_whole_datasets_while_rewritten(cache, tmp_path):
+    cache.write(KEY, "DE", dataset(0))
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        while not stop.is_set():
+            try:
+                df = cache.read(KEY, "DE")
+                assert len(df) == ROWS
+                assert df["version"].nunique() == 1
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for version in range(1, 50):
+            cache.write(KEY, "DE", dataset(version))
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert errors == []
+    assert cache.read(KEY, "DE")["version"].iloc[0] == 49
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_writer_batches_concurrent_writes(cache, monkeypatch):
+    batches = []
+    write_many = cache.write_many
+    monkeypatch.setattr(
+        cache,
+        "write_many",
+        lambda datasets: batches.append(datasets) or write_many(datasets),
+    )
+    writer = CacheWriter(cache, delay=0.2)
+    countries = ["DE", "FR", "AT", "NL"]
+    threads = [
+        threading.Thread(target=writer.write, args=(KEY, country, dataset(i)))
+        for i, country in enumerate(countries)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(batches) < len(countries)
+    for i, country in enumerate(countries):
+        assert cache.read(KEY, country)["version"].iloc[0] == i
+
+
+def test_writer_drops_outdated_writes(cache):
+    writer = CacheWriter(cache)
+    older, newer = writer.ticket(), writer.ticket()
+
+    assert writer.write(KEY, "DE", dataset(2), newer)
+    assert not writer.write(KEY, "DE", dataset(1), older)
+    assert cache.read(KEY, "DE")["version"].iloc[0] == 2
+    # writes without a ticket are never dropped
+    assert writer.write(KEY, "DE", dataset(3))
+    assert cache.read(KEY, "DE")["version"].iloc[0] == 3
+
+
+def test_read_country_skips_the_history(cache):
+    cache.write(KEY, "DE", dataset(0))
+    cache.write(history_key(KEY), "DE", dataset(1))
+    cache.write(KEY, "FR", dataset(2))
+
+    datasets = cache.read_country("DE")
+
+    assert list(datasets) == [KEY]
+    assert datasets[KEY]["version"].eq(0).all()
+
+
+def test_sqlite_read_country_does_not_fetch_the_history(tmp_path, monkeypatch):
+    cache = SQLiteCache(tmp_path / "cache.db")
+    cache.write(KEY, "DE", dataset(0))
+    cache.write(history_key(KEY), "DE", dataset(1))
+    connection = cache.connection
+    fetched = []
+
+    class RecordingConnection:
+        def execute(self, *args):
+            rows = connection.execute(*args).fetchall()
+            fetched.extend(row[0] for row in rows)
+            return rows
+
+    monkeypatch.setattr(SQLiteCache, "connection", RecordingConnection())
+    cache.read_country("DE")
+
+    assert fetched == [KEY]
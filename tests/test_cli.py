@@ -0,0 +1,53 @@
+import json
+
+import httpx
+import pytest
+
+from etl import cli
+from etl.etl import DataProcessor
+from etl.offline import OfflineAPI
+
+KEYS = ["CURRENT_GENERATION_ENTSOE", "RENEWABLE_SHARE_ENERGY_CHARTS"]
+
+
+def run_cli(capsys, *args) -> tuple[int, list[dict]]:
+    try:
+        cli.main(["--countries", "DE", "--keys", *KEYS, "--format", "json", *args])
+        code = 0
+    except SystemExit as e:
+        code = e.code
+    return code, json.loads(capsys.readouterr().out)
+
+
+def test_exit_code_zero_when_all_pipelines_are_done(cache, monkeypatch, capsys):
+    monkeypatch.setattr(DataProcessor, "transport", OfflineAPI().transport())
+
+    code, rows = run_cli(capsys)
+
+    assert code == 0
+    assert {row["status"] for row in rows} == {"done"}
+    assert all(row["rows"] > 0 for row in rows)
+
+
+@pytest.mark.parametrize("status_code", [401, 503])
+def test_exit_code_nonzero_on_http_errors(cache, monkeypatch, capsys, status_code):
+    monkeypatch.setattr(
+        DataProcessor,
+        "transport",
+        httpx.MockTransport(lambda request: httpx.Response(status_code)),
+    )
+
+    code, rows = run_cli(capsys, "--retries", "1")
+
+    assert code == 1
+    assert {row["status"] for row in rows} == {"failed"}
+
+
+def test_dry_run_hides_the_token(cache, monkeypatch, capsys):
+    monkeypatch.setenv("ENTSOE_API_KEY", "secret")
+
+    code, rows = run_cli(capsys, "--dry-run")
+
+    assert code == 0
+    assert {row["action"] for row in rows} == {"fetch"}
+    assert "secret" not in json.dumps(rows)
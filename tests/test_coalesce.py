@@ -0,0 +1,85 @@
+import types
+
+import pandas as pd
+import trio
+
+from etl.coalesce import RequestCoalescer
+
+
+def request(name: str):
+    return types.SimpleNamespace(url="https://example.org", params={"name": name})
+
+
+def counting_fetch(result):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await trio.sleep(0.01)
+        return result
+
+    return fetch, calls
+
+
+def kept(result) -> bool:
+    df, warnings = result
+    return not warnings and not df.empty
+
+
+def test_concurrent_requests_share_one_fetch():
+    coalescer = RequestCoalescer()
+    fetch, calls = counting_fetch((pd.DataFrame({"a": [1.0]}), []))
+    results = []
+
+    async def run():
+        results.append(await coalescer.run(request("a"), fetch, kept))
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            for _ in range(5):
+                nursery.start_soon(run)
+
+    trio.run(main)
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert coalescer.report()["duplicates"] == 4
+
+
+def test_failed_and_empty_results_are_not_kept():
+    coalescer = RequestCoalescer(ttl=60)
+    failed, failed_calls = counting_fetch((pd.DataFrame(), ["api responded 503"]))
+    empty, empty_calls = counting_fetch((pd.DataFrame(), []))
+
+    async def main():
+        for _ in range(2):
+            await coalescer.run(request("failed"), failed, kept)
+            await coalescer.run(request("empty"), empty, kept)
+
+    trio.run(main)
+    assert len(failed_calls) == 2
+    assert len(empty_calls) == 2
+    assert not coalescer._results
+
+
+def test_successful_results_are_kept_until_they_expire():
+    coalescer = RequestCoalescer(ttl=60)
+    fetch, calls = counting_fetch((pd.DataFrame({"a": [1.0]}), []))
+
+    async def main():
+        await coalescer.run(request("a"), fetch, kept)
+        await coalescer.run(request("a"), fetch, kept)
+
+    trio.run(main)
+    assert len(calls) == 1
+
+
+def test_expired_results_are_swept_on_insert():
+    coalescer = RequestCoalescer(ttl=0)
+    fetch, _ = counting_fetch((pd.DataFrame({"a": [1.0]}), []))
+
+    async def main():
+        for i in range(10):
+            await coalescer.run(request(str(i)), fetch, kept)
+
+    trio.run(main)
+    assert len(coalescer._results) == 1
@@ -0,0 +1,50 @@
+import time
+
+import pandas as pd
+
+from etl.cache import PickleCache
+from etl.data import MAX_AGE, Attempt, Data, Freshness
+from etl.etl import DataProcessor
+
+KEY = "CAPACITY_BY_SOURCE_ENTSOE"
+
+
+def frame() -> pd.DataFrame:
+    index = pd.date_range("2024-01-01", periods=4, freq="15min", tz="Europe/Berlin")
+    return pd.DataFrame({"Solar": [1.0, 2.0, 3.0, 4.0]}, index=index)
+
+
+def test_failed_key_backs_off_and_is_due_afterwards():
+    data = Data("DE")
+    data.record_attempt(KEY, False)
+
+    assert data.backing_off(KEY)
+    assert KEY not in data.stale_keys()
+
+    data.attempts[KEY] = Attempt(time.time() - 2 * MAX_AGE[KEY], 1)
+    assert not data.backing_off(KEY)
+    assert KEY in data.stale_keys()
+
+
+def test_fresh_data_wins_over_the_backoff():
+    data = Data("DE")
+    data.attempts[KEY] = Attempt(time.time() - 10 * MAX_AGE[KEY], 3)
+    data.add(KEY, frame(), "DE", Freshness(time.time()))
+
+    assert data.revalidate_at(KEY) > time.time()
+    assert KEY not in data.stale_keys()
+
+
+def test_failure_then_cache_hit_is_not_stale(tmp_path):
+    processor = DataProcessor("DE")
+    processor.cache = PickleCache(tmp_path)
+    # a failed fetch whose backoff is over
+    processor.data.attempts[KEY] = Attempt(time.time() - 2 * MAX_AGE[KEY], 1)
+    assert KEY in processor.data.stale_keys()
+
+    # meanwhile another session cached the dataset
+    processor.cache.write(KEY, "DE", frame())
+
+    assert processor.read_if_fresh(KEY)
+    assert processor.data.attempts[KEY].failures == 0
+    assert processor.data.stale_keys() == set()
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from etl.energy_index import EnergyIndex
+
+TZ = "Europe/Berlin"
+CAPACITY = pd.Series({"Solar": 200.0, "Wind Onshore": 100.0})
+
+
+def generation(start, end, freq="15min") -> pd.DataFrame:
+    index = pd.date_range(start, end, freq=freq, tz=TZ, inclusive="left")
+    rng = np.random.default_rng(len(index))
+    return pd.DataFrame(
+        {
+            "Solar": rng.random(len(index)) * 200,
+            "Wind Onshore": rng.random(len(index)) * 100,
+        },
+        index=index,
+    )
+
+
+def days(df: pd.DataFrame):
+    start = df.index[0].floor("D")
+    while start < df.index[-1]:
+        end = (start + pd.Timedelta(hours=36)).floor("D")  # next midnight
+        yield start, end
+        start = end
+
+
+def baseline_capacity_factor(df: pd.DataFrame, start, end) -> pd.Series:
+    """capacity factor as the mean of the rows of the window"""
+    window = df[(df.index >= start) & (df.index < end)]
+    return window.mean().div(CAPACITY)
+
+
+def assert_matches_baseline(df: pd.DataFrame):
+    index = EnergyIndex(df)
+    for start, end in days(df):
+        pdt.assert_series_equal(
+            index.capacity_factor(start, end, CAPACITY),
+            baseline_capacity_factor(df, start, end),
+            check_names=False,
+        )
+
+
+def test_regular_grid():
+    df = generation("2024-06-01", "2024-06-04")
+    assert_matches_baseline(df)
+
+    index = EnergyIndex(df)
+    start, end = pd.Timestamp("2024-06-02", tz=TZ), pd.Timestamp("2024-06-03", tz=TZ)
+    assert index.covered_hours(start, end).tolist() == [24.0, 24.0]
+    day = df[(df.index >= start) & (df.index < end)]
+    pdt.assert_series_equal(index.energy(start, end), day.sum() / 4)
+
+
+def test_missing_values():
+    df = generation("2024-06-01", "2024-06-04")
+    df.iloc[100:140, 0] = np.nan
+    df.iloc[200:210] = np.nan
+    assert_matches_baseline(df)
+
+    start, end = pd.Timestamp("2024-06-02", tz=TZ), pd.Timestamp("2024-06-03", tz=TZ)
+    # 40 quarter hours of solar missing on the second day
+    assert EnergyIndex(df).covered_hours(start, end).tolist() == [14.0, 24.0]
+
+
+def test_holes_in_the_time_grid():
+    df = generation("2024-06-01", "2024-06-04")
+    df = df.drop(index=df.index[100:108]).drop(index=df.index[250:251])
+    assert_matches_baseline(df)
+
+    start, end = pd.Timestamp("2024-06-02", tz=TZ), pd.Timestamp("2024-06-03", tz=TZ)
+    # the hole of two hours counts with one step of 15 minutes
+    assert EnergyIndex(df).covered_hours(start, end)["Solar"] == 24 - 2
+
+
+@pytest.mark.parametrize("first, then", [("1h", "15min"), ("15min", "1h")])
+def test_resolution_change(first, then):
+    df = pd.concat(
+        [
+            generation("2024-06-01", "2024-06-03", freq=first),
+            generation("2024-06-03", "2024-06-08", freq=then),
+        ]
+    )
+    assert_matches_baseline(df)
+
+    index = EnergyIndex(df)
+    for start, end in days(df):
+        assert index.covered_hours(start, end).tolist() == [24.0, 24.0]
+    # hourly rows count with an hour, whatever the typical step of the frame
+    start, end = pd.Timestamp("2024-06-01", tz=TZ), pd.Timestamp("2024-06-02", tz=TZ)
+    day = df[(df.index >= start) & (df.index < end)]
+    pdt.assert_series_equal(
+        index.energy(start, end), day.sum() * pd.Timedelta(first) / pd.Timedelta("1h")
+    )
+
+
+@pytest.mark.parametrize("day", ["2024-03-31", "2024-10-27"])
+def test_dst_day(day):
+    start = pd.Timestamp(day, tz=TZ)
+    end = (start + pd.Timedelta(hours=36)).floor("D")
+    df = generation(start - pd.Timedelta(days=1), end + pd.Timedelta(days=1))
+    assert_matches_baseline(df)
+
+    hours = (end - start) / pd.Timedelta(hours=1)
+    assert hours in (23, 25)
+    assert EnergyIndex(df).covered_hours(start, end).tolist() == [hours, hours]
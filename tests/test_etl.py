@@ -0,0 +1,65 @@
+import time
+
+import httpx
+import trio
+
+from etl.etl import DataProcessor
+from etl.offline import OfflineAPI
+
+KEYS = ["CURRENT_GENERATION_ENTSOE", "ACTUAL_TOTAL_LOAD_ENTSOE"]
+
+
+async def hanging(request):
+    await trio.sleep(60)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_start_etl_runs_in_the_background(cache, monkeypatch):
+    monkeypatch.setattr(DataProcessor, "transport", OfflineAPI(latency=0.3).transport())
+    processor = DataProcessor("DE")
+
+    started = time.monotonic()
+    assert processor.start_etl(keys=KEYS)
+    assert time.monotonic() - started < 0.2
+    assert not processor.start_etl(keys=KEYS)  # one run at a time
+
+    wait_for(lambda: not processor.etl_running)
+    assert processor.completed
+    assert set(processor.data.keys()) == set(KEYS)
+    assert {processor.status[key] for key in KEYS} == {"done"}
+
+
+def test_partial_deadline_completes_while_pipelines_run(cache, monkeypatch):
+    monkeypatch.setattr(DataProcessor, "transport", OfflineAPI(latency=1).transport())
+    processor = DataProcessor("DE")
+
+    processor.start_etl(keys=KEYS, timeout=0.2, pipeline_timeout=5)
+
+    wait_for(lambda: processor.completed, timeout=0.9)
+    assert processor.etl_running
+    assert not processor.data.keys()
+    # the late datasets are still committed
+    wait_for(lambda: not processor.etl_running)
+    assert set(processor.data.keys()) == set(KEYS)
+
+
+def test_cancel_etl_after_a_country_switch(cache, monkeypatch):
+    monkeypatch.setattr(DataProcessor, "transport", httpx.MockTransport(hanging))
+    processor = DataProcessor("DE")
+    processor.start_etl(keys=KEYS)
+    wait_for(lambda: processor.etl_cancel is not None)
+
+    processor.cancel_etl()
+    processor.set_country_code("FR")
+
+    wait_for(lambda: not processor.etl_running, timeout=2)
+    assert {processor.status[key] for key in KEYS} == {"cancelled"}
+    # a cancelled run is no failure, and did not complete the new country
+    assert processor.countries["DE"].attempts == {}
+    assert not processor.completed
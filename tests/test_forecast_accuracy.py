@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.forecast_accuracy import HALF_LIFE, ForecastAccuracy, OnlineError
+
+TZ = "Europe/Berlin"
+INDEX = pd.date_range("2024-05-01", periods=4 * 6, freq="15min", tz=TZ)
+
+
+def forecast(total: float) -> pd.DataFrame:
+    return pd.DataFrame({"Actual Aggregated": np.full(len(INDEX), total)}, index=INDEX)
+
+
+def generation(solar: float, wind: float) -> pd.DataFrame:
+    columns = pd.MultiIndex.from_product(
+        [["Solar", "Wind Onshore"], ["Actual Aggregated"]]
+    )
+    values = np.tile([solar, wind], (len(INDEX), 1))
+    return pd.DataFrame(values, index=INDEX, columns=columns)
+
+
+def test_online_error_means():
+    stats = OnlineError()
+    stats.update(0.0, forecast=110.0, actual=100.0)
+    stats.update(0.0, forecast=80.0, actual=100.0)
+
+    assert stats.mae == pytest.approx(15.0)
+    assert stats.bias == pytest.approx(-5.0)
+    assert stats.mape == pytest.approx(15.0)
+    assert stats.count == 2
+
+
+def test_online_error_decays_older_errors():
+    stats = OnlineError()
+    stats.update(0.0, forecast=10.0, actual=0.0)
+    stats.update(HALF_LIFE, forecast=0.0, actual=0.0)
+
+    # the first error has half the weight of the second
+    assert stats.mae == pytest.approx(5.0 / 1.5)
+    # no percentage error of actuals close to zero
+    assert math.isnan(stats.mape)
+
+
+def test_forecasts_are_scored_with_the_actuals(tmp_path):
+    accuracy = ForecastAccuracy(tmp_path / "accuracy.json")
+    accuracy.observe("TOTAL_FORECAST_ENTSOE", "DE", forecast(1100.0))
+    assert accuracy.report("DE").empty
+
+    accuracy.observe("CURRENT_GENERATION_ENTSOE", "DE", generation(600.0, 400.0))
+
+    report = accuracy.report("DE").set_index("series")
+    # the latest hour may be incomplete and is not scored yet
+    assert report.loc["Total", "hours"] == 5
+    assert report.loc["Total", "mae"] == pytest.approx(100.0)
+    assert report.loc["Total", "bias"] == pytest.approx(100.0)
+    assert report.loc["Total", "mape"] == pytest.approx(10.0)
+
+    # every hour is scored once
+    accuracy.observe("CURRENT_GENERATION_ENTSOE", "DE", generation(600.0, 400.0))
+    assert accuracy.report("DE").set_index("series").loc["Total", "hours"] == 5
+
+
+def test_state_is_persisted(tmp_path):
+    path = tmp_path / "accuracy.json"
+    accuracy = ForecastAccuracy(path)
+    accuracy.observe("TOTAL_FORECAST_ENTSOE", "DE", forecast(1100.0))
+    accuracy.observe("CURRENT_GENERATION_ENTSOE", "DE", generation(600.0, 400.0))
+
+    restored = ForecastAccuracy(path)
+
+    pd.testing.assert_frame_equal(restored.report(), accuracy.report())
+    assert restored.pending == accuracy.pending
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from etl.etl import DataPipeline
+
+TZ = "Europe/Berlin"
+# more than 10 years of daily dates
+DAYS = pd.date_range("2012-01-01", "2024-12-31", freq="D")
+
+
+def test_parse_days_matches_to_datetime():
+    days = list(DAYS.strftime("%d.%m.%Y"))
+
+    parsed = DataPipeline.parse_days(days)
+
+    expected = pd.DatetimeIndex(pd.to_datetime(days, format="%d.%m.%Y"))
+    pd.testing.assert_index_equal(parsed, expected.as_unit("ns"))
+
+
+def test_parse_days_falls_back_for_non_conforming_dates():
+    days = ["01.01.2020", "2.1.2020", "03.01.2020", "4.10.2020"]
+
+    parsed = DataPipeline.parse_days(days)
+
+    expected = pd.DatetimeIndex(pd.to_datetime(days, format="%d.%m.%Y"))
+    # same unit as the vectorized parsing
+    pd.testing.assert_index_equal(parsed, expected.as_unit("ns"))
+    assert list(parsed.strftime("%Y-%m-%d")) == [
+        "2020-01-01",
+        "2020-01-02",
+        "2020-01-03",
+        "2020-10-04",
+    ]
+
+
+def test_parse_energy_charts_unix_seconds():
+    index = pd.date_range("2024-03-30", "2024-04-01", freq="15min", tz="UTC")
+    content = json.dumps(
+        {
+            "unix_seconds": [int(t.timestamp()) for t in index],
+            "share": [float(i) for i in range(len(index))],
+        }
+    ).encode()
+
+    df = DataPipeline.parse_energy_charts(content, TZ)
+
+    pd.testing.assert_index_equal(
+        df.index.as_unit("ns"), index.tz_convert(TZ).as_unit("ns"), check_names=False
+    )
+    assert str(df.index.tz) == TZ
+    assert df["share"].dtype == np.dtype("f8")
+    assert df["share"].iloc[-1] == len(index) - 1
+
+
+def test_parse_energy_charts_days_with_missing_values():
+    values = [None if i % 7 == 0 else float(i) for i in range(len(DAYS))]
+    content = json.dumps(
+        {
+            "days": list(DAYS.strftime("%d.%m.%Y")),
+            "data": values,
+            "deprecated": False,
+        }
+    ).encode()
+
+    df = DataPipeline.parse_energy_charts(content, TZ)
+
+    pd.testing.assert_index_equal(
+        df.index, DAYS.tz_localize(TZ).as_unit("ns"), check_names=False
+    )
+    assert df["data"].dtype == np.dtype("f8")
+    np.testing.assert_array_equal(
+        df["data"].isna().to_numpy(), [value is None for value in values]
+    )
+    assert df["data"].iloc[1] == 1.0
+    # values which are not lists of numbers are kept as is
+    assert not df["deprecated"].any()
@@ -0,0 +1,53 @@
+import types
+
+import etl.prefetch
+from etl.prefetch import Prefetcher
+
+
+class InlineThread:
+    """runs the target when started, in the calling thread"""
+
+    def __init__(self, target, args=(), daemon=None):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+def recording_prefetcher(tmp_path, monkeypatch, **kwargs) -> tuple[Prefetcher, list]:
+    """a prefetcher whose countries are never warm and which records the
+    countries of each prefetch instead of running their etl
+    """
+    prefetcher = Prefetcher(tmp_path / "country_switches.json", **kwargs)
+    started = []
+
+    async def prefetch(codes):
+        started.append(codes)
+        with prefetcher.lock:
+            prefetcher.running.difference_update(codes)
+
+    monkeypatch.setattr(
+        etl.prefetch, "threading", types.SimpleNamespace(Thread=InlineThread)
+    )
+    monkeypatch.setattr(prefetcher, "is_warm", lambda country_code: False)
+    monkeypatch.setattr(prefetcher, "_prefetch", prefetch)
+    return prefetcher, started
+
+
+def test_cold_countries_are_not_prefetched_again_right_away(tmp_path, monkeypatch):
+    prefetcher, started = recording_prefetcher(tmp_path, monkeypatch)
+
+    prefetcher.prefetch("PT")
+    prefetcher.prefetch("PT")
+    prefetcher.prefetch("ES")
+
+    assert started == [["ES"], ["PT", "FR"]]
+
+
+def test_cold_countries_are_retried_after_the_backoff(tmp_path, monkeypatch):
+    prefetcher, started = recording_prefetcher(tmp_path, monkeypatch, retry_after=0)
+
+    prefetcher.prefetch("PT")
+    prefetcher.prefetch("PT")
+
+    assert started == [["ES"], ["ES"]]
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+import pytest
+
+from etl.data import Data
+from etl.pyramid import LEVELS, ResamplingPyramid
+
+KEY = "CURRENT_GENERATION_ENTSOE"
+
+
+def frame(periods=4 * 24 * 3 - 4, freq="15min", start="2024-03-30") -> pd.DataFrame:
+    index = pd.date_range(start, periods=periods, freq=freq, tz="Europe/Berlin")
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {"Solar": rng.random(periods) * 100, "Wind": rng.random(periods) * 50},
+        index=index,
+    )
+
+
+def assert_matches_fresh_resample(pyramid: ResamplingPyramid, df: pd.DataFrame):
+    for freq in pyramid.freqs:
+        pdt.assert_frame_equal(pyramid.level(freq), df.resample(freq).mean())
+
+
+def test_native_level_is_the_frame_itself():
+    df = frame()
+    pyramid = ResamplingPyramid(df)
+
+    assert pyramid.freqs == list(LEVELS)
+    assert pyramid.native == "15min"
+    assert "15min" not in pyramid.levels
+    assert pyramid.level("15min") is df
+    assert_matches_fresh_resample(pyramid, df)
+
+
+def test_frame_with_holes_keeps_its_native_level():
+    df = frame().drop(index=frame().index[10:20])
+    pyramid = ResamplingPyramid(df)
+
+    assert pyramid.native is None
+    assert_matches_fresh_resample(pyramid, df)
+
+
+@pytest.mark.parametrize("freq", ["15min", "1h"])
+def test_appended_rows_match_a_fresh_resample(freq):
+    full = frame(periods=200, freq=freq)
+    pyramid = ResamplingPyramid(full.iloc[:150])
+    pyramid.update(full.iloc[:170])
+    pyramid.update(full)
+
+    assert_matches_fresh_resample(pyramid, full)
+
+
+def test_changed_rows_match_a_fresh_resample():
+    old = frame()
+    new = old.copy()
+    new.iloc[100:, 0] += 1.0  # revised values from row 100 on
+    new = pd.concat([new, frame(periods=8, start="2024-04-02")])
+    pyramid = ResamplingPyramid(old)
+    pyramid.update(new)
+
+    assert_matches_fresh_resample(pyramid, new)
+
+
+def test_update_with_a_hole_rebuilds_the_native_level():
+    full = frame(periods=200)
+    pyramid = ResamplingPyramid(full.iloc[:100])
+    with_hole = pd.concat([full.iloc[:100], full.iloc[120:]])
+    pyramid.update(with_hole)
+
+    assert pyramid.native is None
+    assert_matches_fresh_resample(pyramid, with_hole)
+
+
+def test_data_nbytes_counts_pyramids_and_energy_indices():
+    data = Data("DE")
+    df = frame(freq="1h")
+    data.add(KEY, df, "DE")
+    records = int(df.memory_usage(deep=True).sum())
+
+    pyramid = data.pyramid(KEY)
+    assert pyramid.native == "1h"
+    assert data.nbytes() == records + pyramid.nbytes()
+    assert pyramid.nbytes() > 0
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from etl.cache import PickleCache
+
+pytest.importorskip("duckdb")
+
+from etl.query import QueryEngine  # noqa: E402
+
+KEY = "CURRENT_GENERATION_ENTSOE"
+START = pd.Timestamp("2024-05-01", tz="Europe/Berlin")
+END = START + pd.Timedelta(days=1)
+
+
+def generation(solar: float, wind: float) -> pd.DataFrame:
+    index = pd.date_range(START, END, freq="15min", inclusive="left")
+    columns = pd.MultiIndex.from_product(
+        [["Solar", "Wind Onshore"], ["Actual Aggregated"]]
+    )
+    return pd.DataFrame(
+        np.tile([solar, wind], (len(index), 1)), index=index, columns=columns
+    )
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # no periodic checks within the test: only forced syncs see new data
+    return QueryEngine(PickleCache(tmp_path / "cache"), tmp_path / "parquet", 3600)
+
+
+def test_mean_by_source_without_data_is_empty(engine):
+    mean = engine.mean_by_source("DE", START, END)
+
+    assert mean.empty
+
+
+def test_mean_by_source_sees_data_cached_since_the_last_sync(engine):
+    assert engine.mean_by_source("DE", START, END).empty
+
+    engine.cache.write(KEY, "DE", generation(100.0, 50.0))
+    assert engine.mean_by_source("DE", START, END).to_dict() == {
+        "Solar": 100.0,
+        "Wind Onshore": 50.0,
+    }
+
+    # a newer version and a new country within the check interval
+    engine.cache.write(KEY, "DE", generation(200.0, 50.0))
+    engine.cache.write(KEY, "FR", generation(10.0, 20.0))
+    assert engine.mean_by_source("DE", START, END)["Solar"] == 200.0
+    assert engine.mean_by_source("FR", START, END)["Solar"] == 10.0
+
+
+def test_unchanged_cache_is_not_exported_again(engine, monkeypatch):
+    engine.cache.write(KEY, "DE", generation(100.0, 50.0))
+    engine.mean_by_source("DE", START, END)
+
+    reads = []
+    read = engine.cache.read
+    monkeypatch.setattr(
+        engine.cache, "read", lambda *args: reads.append(args) or read(*args)
+    )
+    engine.check_every = 0
+    for _ in range(5):
+        engine.mean_by_source("DE", START, END)
+
+    assert reads == []
+    assert list(engine.path.glob("*.tmp")) == []